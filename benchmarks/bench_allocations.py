@@ -0,0 +1,63 @@
+"""
+Memory retained and allocated by the triggers built for every received state_changed event.
+
+    python benchmarks/bench_allocations.py
+"""
+
+import argparse
+import json
+import tracemalloc
+
+import home_assistant_plugin
+
+from payloads import make_frames
+
+
+def make_setup_triggers():
+    service = home_assistant_plugin.service
+    return {
+        service.media_player.trigger.Playing.make("media_player.bath"),
+        service.media_player.trigger.Paused.make("media_player.bath"),
+        service.sensor.float.trigger.Always.make("sensor.washing_machine_power"),
+        service.sensor.float.trigger.GreaterThan.make(
+            "sensor.washing_machine_power", value=2.0
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=10000)
+    args = parser.parse_args()
+
+    factory = home_assistant_plugin.factory.trigger.Factory(make_setup_triggers())
+    print("{:14} {:>18} {:>18}".format("payload", "retained B/event", "peak B/event"))
+    for name, frame in make_frames():
+        text = json.dumps(frame)
+
+        # triggers kept alive, as while they wait in the executor queues
+        triggers = list()
+        tracemalloc.start()
+        for _ in range(args.number):
+            triggers.append(factory.get_triggers_from(json.loads(text)))
+        retained, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del triggers
+
+        # everything allocated while decoding and building triggers for a single event
+        peak = 0
+        for _ in range(args.number // 10):
+            tracemalloc.start()
+            factory.get_triggers_from(json.loads(text))
+            peak += tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        print(
+            "{:14} {:>18.0f} {:>18.0f}".format(
+                name, retained / args.number, peak / (args.number // 10)
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Decode and encode cost per websocket frame of every installed json codec.
+
+    python benchmarks/bench_codec.py
+"""
+
+import argparse
+import json
+import timeit
+
+from home_assistant_plugin import codec
+
+from payloads import make_frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(
+        "{:10} {:14} {:>8} {:>12} {:>12}".format(
+            "codec", "payload", "bytes", "decode us", "encode us"
+        )
+    )
+    for klass in codec.CODECS:
+        if not klass.is_available():
+            print("{:10} not installed".format(klass.NAME))
+            continue
+        instance = klass()
+        for name, frame in make_frames():
+            text = json.dumps(frame)
+            decode = timeit.timeit(lambda: instance.loads(text), number=args.number)
+            encode = timeit.timeit(lambda: instance.dumps(frame), number=args.number)
+            print(
+                "{:10} {:14} {:>8} {:>12.2f} {:>12.2f}".format(
+                    klass.NAME,
+                    name,
+                    len(text),
+                    decode / args.number * 1e6,
+                    encode / args.number * 1e6,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Replay a recording of websocket frames through Gateway.replay as fast as possible.
+
+Without an existing recording, one is made streaming --count events from the local
+Home Assistant stand-in.
+
+    python benchmarks/bench_replay.py frames.gz
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+import home_assistant_plugin
+from home_assistant_plugin import recorder
+from home_assistant_plugin.tests.server import Server
+
+
+def make_setup_triggers(entity_ids):
+    return [
+        home_assistant_plugin.service.sensor.float.trigger.Always.make(entity_id)
+        for entity_id in entity_ids
+    ]
+
+
+def read_entity_ids(path):
+    codec = home_assistant_plugin.codec.make()
+    entity_ids = set()
+    for _, frame in recorder.read(path):
+        try:
+            entity_ids.add(codec.loads(frame)["event"]["data"]["entity_id"])
+        except (KeyError, TypeError):
+            pass
+    return entity_ids
+
+
+async def record(args):
+    server = Server(entities=args.entities, rate=0, count=args.count)
+    await server.start()
+    gateway = home_assistant_plugin.Gateway(
+        server.token, server.host, server.port, record=args.path
+    )
+    gateway.associate_triggers(make_setup_triggers(server.entity_ids))
+
+    async def task(trigger):
+        pass
+
+    running = asyncio.ensure_future(gateway.run([task]))
+    await server.wait_streamed()
+    while gateway.metrics["frames received"] < server.streamed:
+        await asyncio.sleep(0.01)
+    running.cancel()
+    await gateway.disconnect()
+    await server.stop()
+
+
+async def replay(args):
+    gateway = home_assistant_plugin.Gateway("token")
+    gateway.associate_triggers(make_setup_triggers(read_entity_ids(args.path)))
+    triggers = list()
+
+    async def task(trigger):
+        triggers.append(trigger)
+
+    started = time.monotonic()
+    await gateway.replay([task], args.path, realtime=args.realtime)
+    elapsed = time.monotonic() - started
+    print("frames replayed {}".format(gateway.metrics["frames replayed"]))
+    print("triggers        {}".format(len(triggers)))
+    print("frames/s        {:.0f}".format(gateway.metrics["frames replayed"] / elapsed))
+    print("metrics         {}".format(gateway.metrics))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path")
+    parser.add_argument("--entities", type=int, default=100)
+    parser.add_argument("--count", type=int, default=20000)
+    parser.add_argument("--realtime", action="store_true")
+    args = parser.parse_args()
+    if not os.path.exists(args.path):
+        asyncio.run(record(args))
+    asyncio.run(replay(args))
+
+
+if __name__ == "__main__":
+    main()
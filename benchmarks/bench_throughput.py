@@ -0,0 +1,114 @@
+"""
+End to end throughput of Gateway.run against a local Home Assistant stand-in.
+
+    python benchmarks/bench_throughput.py --entities 100 --rate 0 --count 50000
+    python benchmarks/bench_throughput.py --subscription EntityDiffs --attribute-size 512
+"""
+
+import argparse
+import asyncio
+import resource
+import time
+
+import home_assistant_plugin
+from home_assistant_plugin.tests.server import Server
+
+
+def percentile(values, percent):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def make_setup_triggers(entity_ids):
+    return [
+        home_assistant_plugin.service.sensor.float.trigger.Always.make(entity_id)
+        for entity_id in entity_ids
+    ]
+
+
+async def run(args):
+    server = Server(
+        entities=args.entities,
+        rate=args.rate,
+        count=args.count,
+        attributes=args.attributes,
+        attribute_size=args.attribute_size,
+    )
+    await server.start()
+    gateway = home_assistant_plugin.Gateway(
+        server.token,
+        server.host,
+        server.port,
+        subscription_mode=getattr(
+            home_assistant_plugin.subscription, args.subscription
+        ),
+        max_batch=args.max_batch,
+        max_batch_wait=args.max_batch_wait,
+        prefilter_events=args.prefilter,
+    )
+    tracked = server.entity_ids[: max(1, int(len(server.entity_ids) * args.tracked))]
+    gateway.associate_triggers(make_setup_triggers(tracked))
+
+    latencies = list()
+
+    async def task(trigger):
+        sent_at = server.sent_at.pop((trigger.entity_id, str(trigger.state)), None)
+        if sent_at is not None:
+            latencies.append(time.monotonic() - sent_at)
+
+    started = time.monotonic()
+    running = asyncio.ensure_future(gateway.run([task]))
+    await server.wait_streamed()
+    expected = sum(
+        1
+        for n in range(server.streamed)
+        if server.entity_ids[n % len(server.entity_ids)] in tracked
+    )
+    while len(latencies) < expected and time.monotonic() - started < args.timeout:
+        await asyncio.sleep(0.01)
+    elapsed = time.monotonic() - started
+    running.cancel()
+    await gateway.disconnect()
+    await server.stop()
+
+    print("events                {}".format(len(latencies)))
+    print("events/s              {:.0f}".format(len(latencies) / elapsed))
+    print("p50 frame to task ms  {:.3f}".format(percentile(latencies, 50) * 1000))
+    print("p99 frame to task ms  {:.3f}".format(percentile(latencies, 99) * 1000))
+    print(
+        "max RSS MB            {:.1f}".format(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        )
+    )
+    print("metrics               {}".format(gateway.metrics))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entities", type=int, default=100)
+    parser.add_argument("--rate", type=int, default=0, help="events/s, 0 unbounded")
+    parser.add_argument("--count", type=int, default=20000)
+    parser.add_argument("--attributes", type=int, default=4)
+    parser.add_argument("--attribute-size", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--max-batch", type=int, default=1)
+    parser.add_argument("--max-batch-wait", type=float, default=0)
+    parser.add_argument(
+        "--tracked", type=float, default=1.0, help="fraction of entities with triggers"
+    )
+    parser.add_argument(
+        "--prefilter", action="store_true", help="skip untracked events undecoded"
+    )
+    parser.add_argument(
+        "--subscription",
+        default="StateChanged",
+        choices=["Events", "StateChanged", "Entities", "EntityDiffs"],
+    )
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
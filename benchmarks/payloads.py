@@ -0,0 +1,95 @@
+"""
+Realistic Home Assistant websocket frames used by the benchmarks.
+"""
+
+
+def make_state(entity_id, state, attributes):
+    return {
+        "entity_id": entity_id,
+        "state": state,
+        "attributes": attributes,
+        "last_changed": "2021-11-26T01:37:24.265390+00:00",
+        "last_updated": "2021-11-26T01:37:24.265390+00:00",
+        "context": {
+            "id": "01FNC3YHRKBQ6PMZ0K3Q8J3B3W",
+            "parent_id": None,
+            "user_id": None,
+        },
+    }
+
+
+def make_state_changed(entity_id, old_state, new_state, attributes, id=1):
+    return {
+        "id": id,
+        "type": "event",
+        "event": {
+            "event_type": "state_changed",
+            "data": {
+                "entity_id": entity_id,
+                "old_state": make_state(entity_id, old_state, attributes),
+                "new_state": make_state(entity_id, new_state, attributes),
+            },
+            "origin": "LOCAL",
+            "time_fired": "2021-11-26T01:37:24.265429+00:00",
+            "context": {
+                "id": "01FNC3YHRKBQ6PMZ0K3Q8J3B3W",
+                "parent_id": None,
+                "user_id": None,
+            },
+        },
+    }
+
+
+def make_sensor_attributes():
+    return {
+        "state_class": "measurement",
+        "unit_of_measurement": "W",
+        "device_class": "power",
+        "friendly_name": "Washing machine power",
+    }
+
+
+def make_media_player_attributes(size=40):
+    return {
+        "volume_level": 0.15,
+        "is_volume_muted": False,
+        "media_content_id": "x-sonos-spotify:spotify%3atrack%3a6rqhFgbbKwnb9MLmUQDhG6",
+        "media_content_type": "music",
+        "media_duration": 245,
+        "media_position": 12,
+        "media_position_updated_at": "2021-11-26T01:37:24.265390+00:00",
+        "media_title": "Bohemian Rhapsody",
+        "media_artist": "Queen",
+        "media_album_name": "A Night at the Opera",
+        "shuffle": False,
+        "repeat": "off",
+        "queue_position": 3,
+        "source_list": ["Playlist {}".format(n) for n in range(size)],
+        "group_members": ["media_player.bath", "media_player.kitchen"],
+        "entity_picture": "/api/media_player_proxy/media_player.bath?token=e3b0c44298fc1c149afbf4c8996fb924",
+        "friendly_name": "Bath",
+        "supported_features": 64063,
+    }
+
+
+def make_frames():
+    """
+    :return: a name and a decoded frame for every kind of payload
+    """
+    return [
+        (
+            "sensor",
+            make_state_changed(
+                "sensor.washing_machine_power", "2.0", "2.5", make_sensor_attributes()
+            ),
+        ),
+        (
+            "media_player",
+            make_state_changed(
+                "media_player.bath",
+                "paused",
+                "playing",
+                make_media_player_attributes(),
+            ),
+        ),
+    ]
@@ -2,3 +2,12 @@ from home_assistant_plugin.gateway import Gateway
 from home_assistant_plugin.message import Command, Trigger, Description
 from home_assistant_plugin import service
 from home_assistant_plugin import factory
+from home_assistant_plugin import subscription
+from home_assistant_plugin import executor
+from home_assistant_plugin import codec
+from home_assistant_plugin import correlator
+from home_assistant_plugin import backoff
+from home_assistant_plugin import states
+from home_assistant_plugin import template
+from home_assistant_plugin import prefilter
+from home_assistant_plugin import window
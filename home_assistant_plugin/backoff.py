@@ -0,0 +1,47 @@
+import random
+
+
+class Backoff:
+    """
+    Jittered exponential delays between reconnection attempts.
+
+    >>> backoff = Backoff(initial=0.5, maximum=4.0, jitter=0)
+    >>> [backoff.next() for _ in range(6)]
+    [0.5, 1.0, 2.0, 4.0, 4.0, 4.0]
+    >>> backoff.reset()
+    >>> backoff.next()
+    0.5
+    >>> backoff = Backoff(initial=1, maximum=8, jitter=0.5)
+    >>> 0.5 <= backoff.next() <= 1, 1 <= backoff.next() <= 2
+    (True, True)
+    """
+
+    def __init__(self, initial=0.5, maximum=30, factor=2, jitter=0.5):
+        """
+        :param initial: the delay before the first attempt
+        :param maximum: the longest delay
+        :param factor: how much the delay grows after every failed attempt
+        :param jitter: the fraction of the delay randomly taken away,
+        so that many clients do not reconnect all at the same time
+        """
+        self._initial = initial
+        self._maximum = maximum
+        self._factor = factor
+        self._jitter = jitter
+        self._delay = initial
+
+    def next(self):
+        """
+        :return: the seconds to wait before the next attempt
+        """
+        delay = self._delay
+        self._delay = min(self._delay * self._factor, self._maximum)
+        if self._jitter:
+            delay -= delay * self._jitter * random.random()
+        return delay
+
+    def reset(self):
+        """
+        Start again from the initial delay, after a successful attempt.
+        """
+        self._delay = self._initial
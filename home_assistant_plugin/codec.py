@@ -0,0 +1,118 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover
+    msgspec = None
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover
+    ujson = None
+
+
+class Json:
+    """
+    Encodes and decodes websocket messages with the standard library.
+
+    >>> codec = Json()
+    >>> codec.dumps({"id": 6, "type": "get_services"})
+    '{"id":6,"type":"get_services"}'
+    >>> codec.loads(b'{"type": "auth_ok"}')
+    {'type': 'auth_ok'}
+    """
+
+    NAME = "json"
+
+    @staticmethod
+    def is_available():
+        return True
+
+    def loads(self, data):
+        """
+        :param data: a str or bytes websocket frame
+        """
+        return json.loads(data)
+
+    def dumps(self, obj):
+        """
+        :return: a str websocket frame
+        """
+        return json.dumps(obj, separators=(",", ":"))
+
+    def __str__(self):
+        return self.NAME
+
+
+class Orjson(Json):
+
+    NAME = "orjson"
+
+    @staticmethod
+    def is_available():
+        return orjson is not None
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+    def dumps(self, obj):
+        return orjson.dumps(obj).decode()
+
+
+class Msgspec(Json):
+
+    NAME = "msgspec"
+
+    def __init__(self):
+        self._decoder = msgspec.json.Decoder()
+        self._encoder = msgspec.json.Encoder()
+
+    @staticmethod
+    def is_available():
+        return msgspec is not None
+
+    def loads(self, data):
+        return self._decoder.decode(data)
+
+    def dumps(self, obj):
+        return self._encoder.encode(obj).decode()
+
+
+class Ujson(Json):
+
+    NAME = "ujson"
+
+    @staticmethod
+    def is_available():
+        return ujson is not None
+
+    def loads(self, data):
+        return ujson.loads(data)
+
+    def dumps(self, obj):
+        return ujson.dumps(obj, ensure_ascii=False)
+
+
+CODECS = [Orjson, Msgspec, Ujson, Json]
+
+
+def make(name=None):
+    """
+    Make the fastest installed codec, or the one with the given name.
+
+    >>> str(make("json"))
+    'json'
+    >>> make("nothing")
+    Traceback (most recent call last):
+    ...
+    ValueError: Unknown or not installed json codec nothing
+    """
+    for klass in CODECS:
+        if klass.is_available() and (name is None or klass.NAME == name):
+            return klass()
+    raise ValueError("Unknown or not installed json codec {}".format(name))
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import time
+
+from home_assistant_plugin.metrics import Metrics
+
+
+class ResultError(Exception):
+    """
+    Home Assistant answered a command with an unsuccessful result.
+    """
+
+    def __init__(self, code, message):
+        super(ResultError, self).__init__("{}: {}".format(code, message))
+        self.code = code
+        self.message = message
+
+
+class Correlator:
+    """
+    Maps the ids of the sent commands to the futures waiting for their results,
+    keeping at most *max_in_flight* commands without a result.
+
+    >>> import asyncio
+    >>> async def main():
+    ...     correlator = Correlator(max_in_flight=1)
+    ...     future = asyncio.get_event_loop().create_future()
+    ...     await correlator.acquire()
+    ...     correlator.register({"id": 7, "domain": "light", "service": "turn_on"}, [future])
+    ...     correlator.resolve({"id": 7, "type": "result", "success": True, "result": {"context": {}}})
+    ...     return await future, correlator.metrics["commands in flight"]
+    >>> asyncio.run(main())
+    ({'context': {}}, 0)
+    >>> async def main():
+    ...     correlator = Correlator()
+    ...     future = asyncio.get_event_loop().create_future()
+    ...     await correlator.acquire()
+    ...     correlator.register({"id": 8, "domain": "light", "service": "turn_on"}, [future])
+    ...     correlator.resolve({"id": 8, "type": "result", "success": False,
+    ...                         "error": {"code": "not_found", "message": "Service not found."}})
+    ...     return await future
+    >>> asyncio.run(main())
+    Traceback (most recent call last):
+    ...
+    home_assistant_plugin.correlator.ResultError: not_found: Service not found.
+    """
+
+    def __init__(self, max_in_flight=32, timeout=10.0, metrics=None):
+        """
+        :param max_in_flight: how many sent commands can wait for a result at the same time
+        :param timeout: seconds after which a command without a result fails with asyncio.TimeoutError
+        :param metrics: where to count results and observe round trip latencies
+        """
+        self._max_in_flight = max_in_flight
+        self._timeout = timeout
+        self._window = None
+        self._pending = dict()
+        self.metrics = metrics if metrics is not None else Metrics()
+        self._logger = logging.getLogger(__name__)
+
+    async def acquire(self):
+        """
+        Wait for a free slot in the in flight window.
+        """
+        if self._window is None:
+            self._window = asyncio.Semaphore(self._max_in_flight)
+        await self._window.acquire()
+
+    def release(self):
+        """
+        Free a slot acquired for a command which was not sent.
+        """
+        self._window.release()
+
+    def register(self, msg, futures):
+        """
+        :param msg: a sent command, with its id, holding an acquired slot
+        :param futures: the futures waiting for its result
+        """
+        expiry = asyncio.get_event_loop().call_later(
+            self._timeout, self._expire, msg["id"]
+        )
+        self._pending[msg["id"]] = (msg, futures, time.monotonic(), expiry)
+        self.metrics.gauge("commands in flight", len(self._pending))
+
+    def _pop(self, msg_id):
+        msg, futures, sent_at, expiry = self._pending.pop(msg_id)
+        expiry.cancel()
+        self._window.release()
+        self.metrics.gauge("commands in flight", len(self._pending))
+        return msg, futures, sent_at
+
+    @staticmethod
+    def _set(futures, result=None, exception=None):
+        for future in futures:
+            if not future.done():
+                if exception is not None:
+                    future.set_exception(exception)
+                else:
+                    future.set_result(result)
+
+    def resolve(self, result):
+        """
+        :param result: a received result message
+        :return: True if the result belongs to a registered command
+        """
+        if result["id"] not in self._pending:
+            return False
+        msg, futures, sent_at = self._pop(result["id"])
+        self.metrics.observe(
+            "round trip ms {}.{}".format(msg["domain"], msg["service"]),
+            (time.monotonic() - sent_at) * 1000,
+        )
+        if result["success"]:
+            self._set(futures, result=result.get("result"))
+        else:
+            error = result.get("error", {})
+            self.metrics.increment("commands failed")
+            self._logger.error("command {} failed: {}".format(msg, error))
+            self._set(
+                futures,
+                exception=ResultError(error.get("code"), error.get("message")),
+            )
+        return True
+
+    def _expire(self, msg_id):
+        msg, futures, _ = self._pop(msg_id)
+        self.metrics.increment("commands timed out")
+        self._logger.error("command {} got no result".format(msg))
+        self._set(futures, exception=asyncio.TimeoutError())
+
+    def withdraw(self, msg_ids=None):
+        """
+        Take back registered commands which could not be sent, freeing their slots.
+
+        :param msg_ids: the ids of the commands, all of them when None
+        :return: a list of (message, futures) of the ones still waiting for a result,
+        in the order they were sent
+        """
+        withdrawn = list()
+        for msg_id in list(self._pending) if msg_ids is None else msg_ids:
+            if msg_id in self._pending:
+                msg, futures, _ = self._pop(msg_id)
+                withdrawn.append((msg, futures))
+        return withdrawn
+
+    def fail_all(self, exception, msg_ids=None):
+        """
+        Fail the commands still waiting for a result, i.e. when the connection is lost.
+
+        :param exception: the exception raised to the waiting futures
+        :param msg_ids: the ids of the commands to fail, all of them when None
+        """
+        for msg_id in list(self._pending) if msg_ids is None else msg_ids:
+            if msg_id in self._pending:
+                _, futures, _ = self._pop(msg_id)
+                self._set(futures, exception=exception)
@@ -0,0 +1,181 @@
+import functools
+import logging
+
+from home_assistant_plugin.metrics import Metrics
+
+
+class Dispatcher:
+    """
+    Builds the Triggers of a received message once and hands the very same
+    Trigger objects to every task.
+
+    Tasks run through an executor.Executor keyed by entity id, so that the
+    Triggers of an entity are processed in the order their messages arrived.
+
+    >>> import asyncio
+    >>> import home_assistant_plugin
+    >>> setup_trigger = home_assistant_plugin.service.sensor.trigger.On.make("light.kitchen")
+    >>> trigger_factory = home_assistant_plugin.factory.trigger.Factory({setup_trigger})
+    >>> received = []
+    >>> async def first(trigger):
+    ...     received.append(("first", trigger))
+    >>> async def second(trigger):
+    ...     received.append(("second", trigger))
+    >>> executor = home_assistant_plugin.executor.Executor()
+    >>> dispatcher = Dispatcher(trigger_factory, [first, second], executor)
+    >>> message = {
+    ...     "type": "event",
+    ...     "event": {
+    ...         "data": {
+    ...             "entity_id": "light.kitchen",
+    ...             "new_state": {"entity_id": "light.kitchen", "state": "on", "attributes": {}},
+    ...         },
+    ...         "event_type": "state_changed",
+    ...     },
+    ... }
+    >>> async def main():
+    ...     dispatcher.dispatch(message)
+    ...     await executor.join()
+    >>> asyncio.run(main())
+    >>> [name for name, _ in received]
+    ['first', 'second']
+    >>> received[0][1] is received[1][1]
+    True
+    >>> dispatcher.metrics["triggers built"], dispatcher.metrics["triggers per frame"]
+    (1, 1)
+
+    Batch tasks receive the Triggers of all the messages of a batch at once
+
+    >>> batches = []
+    >>> async def batch_task(triggers):
+    ...     batches.append([trigger.entity_id for trigger in triggers])
+    >>> dispatcher = Dispatcher(trigger_factory, [], executor, batch_tasks=[batch_task])
+    >>> async def main():
+    ...     dispatcher.dispatch_batch([message, message, message], "events dispatched")
+    ...     await executor.join()
+    >>> asyncio.run(main())
+    >>> batches
+    [['light.kitchen', 'light.kitchen', 'light.kitchen']]
+    >>> dispatcher.metrics["events dispatched"]
+    3
+
+    Messages changing nothing the setup triggers look at are dropped, once asked
+
+    >>> unchanged = {
+    ...     "type": "event",
+    ...     "event": {
+    ...         "data": {
+    ...             "entity_id": "light.kitchen",
+    ...             "old_state": {"entity_id": "light.kitchen", "state": "on",
+    ...                           "attributes": {"brightness": 100}},
+    ...             "new_state": {"entity_id": "light.kitchen", "state": "on",
+    ...                           "attributes": {"brightness": 180}},
+    ...         },
+    ...         "event_type": "state_changed",
+    ...     },
+    ... }
+    >>> dispatcher = Dispatcher(trigger_factory, [first], executor, drop_unchanged=True)
+    >>> dispatcher.dispatch(unchanged), dispatcher.metrics["messages unchanged"]
+    ([], 1)
+    """
+
+    # the executor key of the batch tasks
+    BATCH = object()
+
+    def __init__(
+        self,
+        trigger_factory,
+        tasks,
+        executor,
+        metrics=None,
+        batch_tasks=(),
+        drop_unchanged=False,
+    ):
+        """
+        :param trigger_factory: a factory.trigger.Factory
+        :param tasks: functions processing a Trigger
+        :param executor: an executor.Executor running the tasks
+        :param metrics: where to count built and dispatched triggers
+        :param batch_tasks: functions processing the list of the Triggers of a batch
+        :param drop_unchanged: drop the messages whose old and new states are the same
+        through the projection of the setup triggers, see factory.trigger.Factory.is_unchanged
+        """
+        self.trigger_factory = trigger_factory
+        self._drop_unchanged = drop_unchanged
+        self._tasks = tasks
+        self._batch_tasks = batch_tasks
+        self._executor = executor
+        self.metrics = metrics if metrics is not None else Metrics()
+        self._logger = logging.getLogger(__name__)
+
+    def dispatch(self, message):
+        """
+        :param message: a decoded state_changed event message
+        :return: the dispatched Triggers
+        """
+        if self._drop_unchanged and self.trigger_factory.is_unchanged(message):
+            self.metrics.increment("messages unchanged")
+            return []
+        triggers = self.trigger_factory.get_triggers_from(message)
+        self.metrics.increment("frames dispatched")
+        self.metrics.increment("triggers built", len(triggers))
+        self.metrics.gauge("triggers per frame", len(triggers))
+        if triggers:
+            self.dispatch_triggers(triggers)
+        else:
+            self.metrics.increment("frames discarded")
+        return triggers
+
+    def dispatch_triggers(self, triggers, coalesce=True):
+        """
+        Hand already built Triggers of the same entity to the tasks,
+        i.e. a held value evaluated again.
+
+        :param triggers: a non empty list of Triggers
+        :param coalesce: False for Triggers which never replace the queued ones
+        of the entity, nor are replaced, when the executor coalesces
+        """
+        self._executor.submit(
+            triggers[0].entity_id, functools.partial(self._run, triggers), coalesce
+        )
+
+    def dispatch_batch(self, messages, counter=None):
+        """
+        Dispatch every message, then hand all of their Triggers at once to the batch tasks.
+
+        :param messages: decoded state_changed event messages
+        :param counter: the name of a metric counting the messages with Triggers, if any
+        :return: the dispatched Triggers
+        """
+        triggers = list()
+        dispatched = 0
+        for message in messages:
+            built = self.dispatch(message)
+            if built:
+                dispatched += 1
+                triggers.extend(built)
+        if counter is not None:
+            self.metrics.increment(counter, dispatched)
+        self.metrics.increment("batches dispatched")
+        self.metrics.gauge("messages per batch", len(messages))
+        if triggers and self._batch_tasks:
+            # batches are never coalesced, each one carries different entities
+            self._executor.submit(
+                self.BATCH, functools.partial(self._run_batch, triggers), False
+            )
+        return triggers
+
+    async def _run_batch(self, triggers):
+        for task in self._batch_tasks:
+            try:
+                await task(triggers)
+            except Exception as e:
+                self._logger.error("batch task failed: {}".format(e))
+
+    async def _run(self, triggers):
+        for task in self._tasks:
+            for trigger in triggers:
+                try:
+                    await task(trigger)
+                except Exception as e:
+                    self._logger.error("task failed on {}: {}".format(trigger, e))
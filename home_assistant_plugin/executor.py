@@ -0,0 +1,123 @@
+import asyncio
+import collections
+import logging
+
+from home_assistant_plugin.metrics import Metrics
+
+
+class Executor:
+    """
+    Runs jobs one after the other for the same key (i.e. an entity id), preserving their order,
+    while jobs of different keys run concurrently, at most *max_in_flight* at once.
+
+    >>> import asyncio
+    >>> done = []
+    >>> async def job(key, value):
+    ...     await asyncio.sleep(0)
+    ...     done.append((key, value))
+    >>> async def main(executor):
+    ...     for value in range(3):
+    ...         executor.submit("sensor.power", lambda value=value: job("sensor.power", value))
+    ...     executor.submit("sensor.wind", lambda: job("sensor.wind", 0))
+    ...     await executor.join()
+    >>> executor = Executor(max_in_flight=2)
+    >>> asyncio.run(main(executor))
+    >>> [value for key, value in done if key == "sensor.power"]
+    [0, 1, 2]
+    >>> executor.metrics["jobs done"], executor.metrics["queued jobs"]
+    (4, 0)
+
+    With *coalesce*, queued jobs which have not started yet are replaced by a later job for the same key.
+
+    >>> done = []
+    >>> executor = Executor(max_in_flight=2, coalesce=True)
+    >>> asyncio.run(main(executor))
+    >>> [value for key, value in done if key == "sensor.power"]
+    [2]
+    >>> executor.metrics["jobs coalesced"]
+    2
+
+    Jobs submitted without *coalesce* never replace the queued jobs, nor are replaced
+
+    >>> done = []
+    >>> async def main(executor):
+    ...     executor.submit("sensor.power", lambda: job("sensor.power", 0))
+    ...     executor.submit("sensor.power", lambda: job("sensor.power", "held"), coalesce=False)
+    ...     executor.submit("sensor.power", lambda: job("sensor.power", 1))
+    ...     executor.submit("sensor.power", lambda: job("sensor.power", 2))
+    ...     await executor.join()
+    >>> asyncio.run(main(Executor(coalesce=True)))
+    >>> [value for key, value in done]
+    ['held', 2]
+    """
+
+    def __init__(self, max_in_flight=64, coalesce=False, metrics=None):
+        """
+        :param max_in_flight: how many jobs can run at the same time
+        :param coalesce: keep only the latest queued job for every key
+        :param metrics: where to count jobs and gauge queues
+        """
+        self._max_in_flight = max_in_flight
+        self._coalesce = coalesce
+        self._semaphore = None
+        self._queues = dict()
+        self._workers = dict()
+        self._queued = 0
+        self._in_flight = 0
+        self.metrics = metrics if metrics is not None else Metrics()
+        self._logger = logging.getLogger(__name__)
+
+    def submit(self, key, job, coalesce=True):
+        """
+        :param key: jobs with the same key are run in submission order
+        :param job: a function returning an awaitable
+        :param coalesce: False for a job which never replaces the queued jobs of the key,
+        nor is replaced by a later one, even when coalescing
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_in_flight)
+        queue = self._queues.setdefault(key, collections.deque())
+        if self._coalesce and coalesce and queue:
+            kept = [entry for entry in queue if not entry[1]]
+            if len(kept) < len(queue):
+                self.metrics.increment("jobs coalesced", len(queue) - len(kept))
+                self._queued -= len(queue) - len(kept)
+                queue.clear()
+                queue.extend(kept)
+        queue.append((job, coalesce))
+        self._queued += 1
+        self.metrics.increment("jobs submitted")
+        self.metrics.gauge("queued jobs", self._queued)
+        self.metrics.gauge(
+            "max queue depth", max(self.metrics["max queue depth"], len(queue))
+        )
+        if key not in self._workers:
+            self._workers[key] = asyncio.ensure_future(self._work(key, queue))
+            self.metrics.gauge("busy keys", len(self._workers))
+
+    async def _work(self, key, queue):
+        while queue:
+            job, _ = queue.popleft()
+            self._queued -= 1
+            self.metrics.gauge("queued jobs", self._queued)
+            async with self._semaphore:
+                self._in_flight += 1
+                self.metrics.gauge("jobs in flight", self._in_flight)
+                try:
+                    await job()
+                except Exception as e:
+                    self._logger.error("job for {} failed: {}".format(key, e))
+                finally:
+                    self._in_flight -= 1
+                    self.metrics.gauge("jobs in flight", self._in_flight)
+                    self.metrics.increment("jobs done")
+        del self._queues[key]
+        del self._workers[key]
+        self.metrics.gauge("busy keys", len(self._workers))
+
+    async def join(self):
+        """
+        Wait until every submitted job is done.
+        """
+        while self._workers:
+            await asyncio.gather(*self._workers.values())
@@ -1 +1,2 @@
 from home_assistant_plugin.factory import trigger
+from home_assistant_plugin.factory import threshold
@@ -0,0 +1,101 @@
+import bisect
+import numbers
+
+from home_assistant_plugin.service.trigger import Comparison
+
+
+class Region:
+    """
+    An elementary interval between the sorted thresholds of an entity,
+    knowing which comparison triggers fire for any value inside it.
+    """
+
+    __slots__ = ("_covered", "_fired")
+
+    def __init__(self, covered, fired):
+        """
+        :param covered: the ids of the comparison triggers compiled in the index
+        :param fired: the ids of the ones firing inside this region
+        """
+        self._covered = covered
+        self._fired = fired
+
+    def covers(self, setup_trigger):
+        return id(setup_trigger) in self._covered
+
+    def fires(self, setup_trigger):
+        return id(setup_trigger) in self._fired
+
+
+class Index:
+    """
+    The numeric comparison triggers of an entity compiled into sorted boundaries,
+    so that a received value is located with a binary search, whatever
+    the number of thresholds, in a Region telling which triggers fire.
+
+    >>> import home_assistant_plugin
+    >>> float_trigger = home_assistant_plugin.service.sensor.float.trigger
+    >>> above_20 = float_trigger.GreaterThan.make("sensor.temperature", value=20)
+    >>> below_10 = float_trigger.LesserThan.make("sensor.temperature", value=10)
+    >>> between_14_15 = float_trigger.InBetween.make("sensor.temperature", value=14)
+    >>> triggers = [above_20, below_10, between_14_15]
+    >>> index = Index(triggers)
+    >>> def fired(value):
+    ...     region = index.locate(value)
+    ...     return [trigger.state for trigger in triggers if region.fires(trigger)]
+    >>> [fired(value) for value in (5, 10, 14, 14.5, 15, 20, 20.1)]
+    [[10.0], [], [], [14.0], [], [], [20.0]]
+    >>> all(
+    ...     index.locate(value).fires(trigger) == trigger.is_triggered_by(value)
+    ...     for value in range(-5, 30) for trigger in triggers
+    ... )
+    True
+    """
+
+    def __init__(self, setup_triggers):
+        """
+        :param setup_triggers: comparison triggers of the same entity with a numeric state
+        """
+        covered = frozenset(id(trigger) for trigger in setup_triggers)
+        boundaries = set()
+        for trigger in setup_triggers:
+            boundaries.update(trigger.boundaries())
+        self._boundaries = sorted(boundaries)
+        self._regions = [
+            Region(
+                covered,
+                frozenset(
+                    id(trigger)
+                    for trigger in setup_triggers
+                    if trigger.is_triggered_by(value)
+                ),
+            )
+            for value in self._representatives(self._boundaries)
+        ]
+
+    @staticmethod
+    def _representatives(boundaries):
+        # a value for each elementary region: below the first boundary, every boundary,
+        # in between two consecutive boundaries and above the last one
+        yield boundaries[0] - 1
+        for lower, upper in zip(boundaries, boundaries[1:]):
+            yield lower
+            yield (lower + upper) / 2
+        yield boundaries[-1]
+        yield boundaries[-1] + 1
+
+    def locate(self, value):
+        """
+        :param value: a received numeric state
+        :return: the Region holding the value
+        """
+        position = bisect.bisect_left(self._boundaries, value)
+        if position < len(self._boundaries) and self._boundaries[position] == value:
+            return self._regions[2 * position + 1]
+        return self._regions[2 * position]
+
+    @staticmethod
+    def is_indexable(setup_trigger):
+        return isinstance(setup_trigger, Comparison) and isinstance(
+            setup_trigger.state, numbers.Real
+        )
@@ -1,23 +1,237 @@
 from home_assistant_plugin import service
+from home_assistant_plugin.factory import threshold
+from home_assistant_plugin.metrics import Metrics
 
 
 class Factory:
     """
     A factory which builds Triggers from Home Assistant messages received through the websocket API
+
+    Trigger classes are precompiled in a dispatch table indexed by entity id and then by state,
+    so that a message of an entity without setup triggers costs a single lookup.
+    Built Triggers keep only the attributes referenced by the setup triggers of their entity.
+    The numeric comparison setup triggers of an entity are compiled in a threshold.Index,
+    built Triggers carry the Region of their value, so that comparisons are a lookup.
+    Numeric states are parsed once, the non numeric ones are counted per entity.
+    The comparison and the aggregating setup triggers count their suppressed values
+    in the same metrics.
+    The setup triggers of an entity project its states on the state and the attributes
+    they look at, so that a message changing nothing else can be told apart.
+
+    >>> import home_assistant_plugin
+    >>> setup_triggers = {
+    ...     home_assistant_plugin.service.media_player.trigger.Playing.make("media_player.bath"),
+    ...     home_assistant_plugin.service.media_player.trigger.Paused.make("media_player.bath"),
+    ... }
+    >>> factory = Factory(setup_triggers)
+    >>> def make_message(entity_id, state):
+    ...     return {
+    ...         "type": "event",
+    ...         "event": {
+    ...             "data": {
+    ...                 "entity_id": entity_id,
+    ...                 "new_state": {"entity_id": entity_id, "state": state, "attributes": {}},
+    ...             },
+    ...             "event_type": "state_changed",
+    ...         },
+    ...     }
+    >>> sorted(trigger.__class__.__name__ for trigger in factory.get_triggers_from(make_message("media_player.bath", "playing")))
+    ['Paused', 'Playing']
+    >>> factory.get_triggers_from(make_message("media_player.kitchen", "playing"))
+    []
+    >>> float_trigger = home_assistant_plugin.service.sensor.float.trigger
+    >>> setup_triggers = {
+    ...     float_trigger.GreaterThan.make("sensor.power", value=value) for value in (100, 200, 300)
+    ... }
+    >>> [trigger] = Factory(setup_triggers).get_triggers_from(make_message("sensor.power", "250"))
+    >>> sorted(setup.state for setup in setup_triggers if setup.is_triggered(trigger))
+    [100.0, 200.0]
+    >>> factory = Factory(setup_triggers | {float_trigger.Always.make("sensor.power")})
+    >>> triggers = factory.get_triggers_from(make_message("sensor.power", "unavailable"))
+    >>> len(triggers), [setup for setup in setup_triggers if setup.is_triggered(triggers[0])]
+    (2, [])
+    >>> factory.metrics["non numeric states sensor.power"]
+    1
+    >>> throttled = float_trigger.GreaterThan.make("sensor.power", value=100, throttle=60)
+    >>> factory = Factory({throttled})
+    >>> [throttled.is_triggered(trigger)
+    ...  for trigger in factory.get_triggers_from(make_message("sensor.power", "150"))
+    ...  + factory.get_triggers_from(make_message("sensor.power", "160"))]
+    [True, False]
+    >>> factory.metrics["suppressed by throttle sensor.power"]
+    1
+
+    Every setup trigger object is wired, the equal ones of different performers included
+
+    >>> twins = [float_trigger.GreaterThan.make("sensor.power", value=100, hold=5) for _ in range(2)]
+    >>> factory = Factory(twins, schedule=print)
+    >>> [twin.metrics is factory.metrics and twin.schedule is print for twin in twins]
+    [True, True]
+
+    Setup triggers project the received states on what they look at
+
+    >>> factory = Factory({
+    ...     home_assistant_plugin.service.media_player.trigger.Playing.make("media_player.bath"),
+    ...     float_trigger.Always.make("sensor.power"),
+    ... })
+    >>> def make_change(entity_id, old, new):
+    ...     message = make_message(entity_id, new[0])
+    ...     data = message["event"]["data"]
+    ...     data["old_state"] = {"entity_id": entity_id, "state": old[0], "attributes": old[1]}
+    ...     data["new_state"]["attributes"] = new[1]
+    ...     return message
+    >>> factory.is_unchanged(make_change(
+    ...     "media_player.bath", ("playing", {"media_position": 1}), ("playing", {"media_position": 2})
+    ... ))
+    True
+    >>> factory.is_unchanged(make_change("media_player.bath", ("playing", {}), ("paused", {})))
+    False
+    >>> factory.is_unchanged(make_change("sensor.power", ("10", {}), ("10", {})))
+    False
     """
 
-    def __init__(self, setup_triggers):
+    FACTORIES = list()
+
+    @classmethod
+    def register(cls, factory):
+        """
+        Add a service factory to the ones compiling the dispatch table.
+
+        :param factory: a class built with the setup triggers, whose *index* method
+        yields (entity_id, state, Trigger class) tuples, a None state matches every state
+        :return: the given factory
         """
-        :param static_triggers: Triggers built at startup (decided by the configuration),
+        cls.FACTORIES.append(factory)
+        return factory
+
+    def __init__(self, setup_triggers, metrics=None, schedule=None):
+        """
+        :param setup_triggers: Triggers built at startup (decided by the configuration),
         which helps to evaluate new bus messages and map them in triggers
+        :param metrics: where to count the non numeric states of numeric triggers
+        and the values suppressed by comparison and aggregating triggers
+        :param schedule: a function called with a delay in seconds and a function
+        making a Trigger to dispatch again after the delay, i.e. once its hold expired
         """
         self._setup_triggers = setup_triggers
-        self._factories = list()
-        self._factories.append(service.media_player.trigger.Factory(setup_triggers))
-        self._factories.append(service.sensor.trigger.Factory(setup_triggers))
+        self.metrics = metrics if metrics is not None else Metrics()
+        entries = dict()
+        for factory in self.FACTORIES:
+            for entity_id, state, klass in factory(setup_triggers).index():
+                entries.setdefault(entity_id, list()).append((state, klass))
+        self._index = dict()
+        for entity_id, entity_entries in entries.items():
+            states = {state for state, _ in entity_entries}
+            states.add(None)
+            self._index[entity_id] = {
+                state: self._compile(entity_entries, state) for state in states
+            }
+        self.attribute_keys = dict()
+        self._projections = dict()
+        comparisons = dict()
+        for trigger in setup_triggers:
+            keys = self.attribute_keys.setdefault(trigger.entity_id, set())
+            keys.update(getattr(trigger, "attributes", {}))
+            self._project(trigger)
+            if isinstance(
+                trigger,
+                (service.trigger.Comparison, service.sensor.float.trigger.Always),
+            ):
+                trigger.metrics = self.metrics
+            if isinstance(trigger, service.trigger.Comparison):
+                trigger.schedule = schedule
+            if threshold.Index.is_indexable(trigger):
+                comparisons.setdefault(trigger.entity_id, list()).append(trigger)
+        self._thresholds = {
+            entity_id: threshold.Index(triggers)
+            for entity_id, triggers in comparisons.items()
+        }
+
+    def _project(self, setup_trigger):
+        # an entity has no projection as soon as one of its setup triggers has none
+        entity_id = setup_trigger.entity_id
+        projection = setup_trigger.projection()
+        keys = self._projections.get(entity_id, frozenset())
+        if projection is None or keys is None:
+            self._projections[entity_id] = None
+        else:
+            self._projections[entity_id] = keys | projection
+
+    def is_unchanged(self, message):
+        """
+        :param message: a state_changed event message
+        :return: True when the state and the attributes projected by the setup triggers
+        of the entity are the same in the old and in the new state,
+        so that no setup trigger may have a different outcome
+        """
+        try:
+            data = message["event"]["data"]
+            keys = self._projections[data["entity_id"]]
+            old_state = data["old_state"]
+            new_state = data["new_state"]
+        except (KeyError, TypeError):
+            return False
+        if keys is None or not old_state or not new_state:
+            return False
+        if old_state.get("state") != new_state.get("state"):
+            return False
+        old_attributes = old_state.get("attributes") or {}
+        new_attributes = new_state.get("attributes") or {}
+        missing = object()
+        return all(
+            old_attributes.get(key, missing) == new_attributes.get(key, missing)
+            for key in keys
+        )
+
+    @staticmethod
+    def _compile(entries, state):
+        klasses = list()
+        for entry_state, klass in entries:
+            if entry_state in (None, state) and klass not in klasses:
+                klasses.append(klass)
+        return tuple(klasses)
 
     def get_triggers_from(self, message):
-        triggers = list()
-        for factory in self._factories:
-            triggers.extend(factory.get_triggers_from(message))
+        try:
+            data = message["event"]["data"]
+            entity_id = data["entity_id"]
+            states = self._index[entity_id]
+            new_state = data["new_state"]
+            state = new_state["state"]
+        except (KeyError, TypeError):
+            return []
+        try:
+            klasses = states[state]
+        except (KeyError, TypeError):
+            klasses = states[None]
+        attributes = new_state.get("attributes") or {}
+        attributes = {
+            key: attributes[key]
+            for key in self.attribute_keys.get(entity_id, ())
+            if key in attributes
+        }
+        triggers = [
+            klass.make_from_state(entity_id, state, attributes) for klass in klasses
+        ]
+        index = self._thresholds.get(entity_id)
+        non_numeric = False
+        for trigger in triggers:
+            if isinstance(trigger, service.sensor.trigger.NumericMixin):
+                value = trigger.state
+                if value is service.trigger.NOT_A_NUMBER:
+                    non_numeric = True
+                elif (
+                    index is not None
+                    and isinstance(trigger, service.trigger.Comparison)
+                    and value == value
+                ):
+                    # NaN is never ordered, it keeps the plain comparison
+                    trigger._region = index.locate(value)
+        if non_numeric:
+            # once per message, whatever the number of numeric trigger classes
+            self.metrics.increment("non numeric states {}".format(entity_id))
         return triggers
+
+
+Factory.register(service.media_player.trigger.Factory)
+Factory.register(service.sensor.trigger.Factory)
@@ -1,10 +1,45 @@
-import copy
 import logging
 
 import home
 
 
+def replace(template, keys, value):
+    """
+    Copy the given template message setting value under the given keys path.
+
+    Only the dicts along the path are copied, every other object is shared with the template.
+
+    >>> template = {"event": {"data": {"entity_id": "none", "new_state": {"state": "on"}}}}
+    >>> message = replace(template, ("event", "data", "entity_id"), "light.kitchen")
+    >>> message["event"]["data"]["entity_id"], template["event"]["data"]["entity_id"]
+    ('light.kitchen', 'none')
+    >>> message["event"]["data"]["new_state"] is template["event"]["data"]["new_state"]
+    True
+    """
+    message = dict(template)
+    if len(keys) == 1:
+        message[keys[0]] = value
+    else:
+        message[keys[0]] = replace(template[keys[0]], keys[1:], value)
+    return message
+
+
 class Description(home.protocol.Description):
+    """
+    Descriptions are compared and hashed through an identity key,
+    a tuple computed once, on first use, since *make* sets the entity id after construction.
+
+    >>> import home_assistant_plugin
+    >>> play = home_assistant_plugin.service.media_player.command.Play.make(["bath_player"])
+    >>> play._identity()
+    ('home_assistant', 'call_service', 'media_player', 'media_play', ('bath_player',))
+    >>> play == home_assistant_plugin.service.media_player.command.Play.make(["bath_player"])
+    True
+    >>> len({play, home_assistant_plugin.service.media_player.command.Play.make(["bath_player"])})
+    1
+    """
+
+    __slots__ = ("_type", "_entity_id", "_message", "_label", "_key", "_hash")
 
     PROTOCOL = "home_assistant"
 
@@ -12,22 +47,36 @@ class Description(home.protocol.Description):
         "type": "none",
     }
 
+    _logger = logging.getLogger(__name__)
+
     def __init__(self, message):
         super(Description, self).__init__(message)
         self._type = message["type"]
         self._entity_id = "none"
         self._message = message
-        self._logger = logging.getLogger(__name__)
-        self._label = str(self._message)
+        self._label = None
+        self._key = None
+        self._hash = None
+
+    def _make_key(self):
+        return self.PROTOCOL, self.type
+
+    def _identity(self):
+        if self._key is None:
+            self._key = self._make_key()
+        return self._key
 
     def __eq__(self, other):
-        if self.PROTOCOL == other.PROTOCOL:
-            if self.type == other.type:
-                return True
-        return False
+        if self is other:
+            return True
+        if not isinstance(other, Description):
+            return False
+        return self._identity() == other._identity()
 
     def __hash__(self):
-        return hash("{}".format(self.type))
+        if self._hash is None:
+            self._hash = hash(self._identity())
+        return self._hash
 
     @property
     def type(self):
@@ -37,9 +86,19 @@ class Description(home.protocol.Description):
     def message(self):
         return self._message
 
+    @property
+    def label(self):
+        if self._label is None:
+            self._label = str(self.message)
+        return self._label
+
+    @label.setter
+    def label(self, value):
+        self._label = value
+
     @classmethod
     def make(cls, entity_id):
-        message = cls(copy.deepcopy(cls.Message))
+        message = cls(dict(cls.Message))
         message._entity_id = entity_id
         return message
 
@@ -58,6 +117,22 @@ class Description(home.protocol.Description):
 
 
 class Trigger(home.protocol.Trigger, Description):
+    """
+    Triggers built from received messages are lightweight: they keep only
+    the entity id, the state and the attributes referenced by the setup triggers.
+
+    >>> trigger = Trigger.make_from_state("sensor.wind", "3.5", {})
+    >>> trigger.entity_id, trigger.state
+    ('sensor.wind', '3.5')
+    >>> trigger.message["event"]["data"]["new_state"]["state"]
+    '3.5'
+    >>> Trigger.make("sensor.wind").is_triggered(trigger)
+    True
+    >>> Trigger.make("sensor.rain").is_triggered(trigger)
+    False
+    """
+
+    __slots__ = ("_state", "_attributes", "_events")
 
     Message = {
         "type": "event",
@@ -81,7 +156,7 @@ class Trigger(home.protocol.Trigger, Description):
                         "attributes"
                     ]
                 except KeyError:
-                    pass
+                    self._attributes = {}
             else:
                 raise AttributeError(
                     "Given message ({}) is not a state_changed event message"
@@ -93,6 +168,46 @@ class Trigger(home.protocol.Trigger, Description):
                 'it should have type "event"'.format(message)
             )
 
+    @classmethod
+    def make_from_state(cls, entity_id, state, attributes):
+        """
+        Make a Trigger from a received state, without keeping the received message.
+
+        :param entity_id: the entity id
+        :param state: the entity state
+        :param attributes: the entity attributes referenced by the setup triggers
+        """
+        trigger = cls.__new__(cls)
+        trigger._type = cls.Message["type"]
+        trigger._entity_id = entity_id
+        trigger._state = state
+        trigger._attributes = attributes
+        trigger._events = ()
+        trigger._message = None
+        trigger._label = None
+        trigger._key = None
+        trigger._hash = None
+        return trigger
+
+    @property
+    def message(self):
+        if self._message is None:
+            self._message = {
+                "type": self._type,
+                "event": {
+                    "data": {
+                        "entity_id": self._entity_id,
+                        "new_state": {
+                            "entity_id": self._entity_id,
+                            "state": self._state,
+                            "attributes": self._attributes,
+                        },
+                    },
+                    "event_type": "state_changed",
+                },
+            }
+        return self._message
+
     @property
     def entity_id(self):
         return self._entity_id
@@ -105,24 +220,22 @@ class Trigger(home.protocol.Trigger, Description):
     def attributes(self):
         return self._attributes
 
-    def __eq__(self, other):
-        if super(Trigger, self).__eq__(other):
-            if self.__class__ == other.__class__:
-                if self.entity_id == other.entity_id:
-                    return True
-        return False
+    def _make_key(self):
+        return super(Trigger, self)._make_key() + (self.__class__, self.entity_id)
 
-    def __hash__(self):
-        return hash("{}{}".format(super(Trigger, self).__hash__(), self.entity_id))
+    def projection(self):
+        """
+        :return: the attribute keys which, along with the state, may change the outcome
+        of *is_triggered*, None when every received state matters
+        """
+        return None
 
     def is_triggered(self, another_description):
         if super(Trigger, self).is_triggered(another_description):
-            try:
-                other = self.__class__(another_description.message)
-                if self.entity_id == other.entity_id:
-                    return True
-            except AttributeError:
-                return False
+            return (
+                isinstance(another_description, Trigger)
+                and self.entity_id == another_description.entity_id
+            )
         return False
 
     def __str__(self, *args, **kwargs):
@@ -131,8 +244,7 @@ class Trigger(home.protocol.Trigger, Description):
 
     @classmethod
     def make(cls, entity_id, events=None):
-        message = copy.deepcopy(cls.Message)
-        message["event"]["data"]["entity_id"] = entity_id
+        message = replace(cls.Message, ("event", "data", "entity_id"), entity_id)
         return cls(message, events)
 
     @classmethod
@@ -175,8 +287,13 @@ class Command(home.protocol.Command, Description):
         },
     }
 
+    # the service data fields changing between executions, see template.Template
+    Variables = ()
+
     def __init__(self, message):
         super(Command, self).__init__(message)
+        # the template.Template of this command by codec name
+        self._templates = dict()
         if message["type"] == self.Message["type"]:
             self._domain = message["domain"]
             self._service = message["service"]
@@ -187,25 +304,11 @@ class Command(home.protocol.Command, Description):
                 'it should be of type "event"'.format(message)
             )
 
-    def __eq__(self, other):
-        if super(Command, self).__eq__(other):
-            if (
-                self.entity_id == other.entity_id
-                and self.domain == other.domain
-                and self.service == other.service
-            ):
-                return True
-        return False
-
-    def __hash__(self):
-        return hash(
-            "{}{}{}{}".format(
-                super(Command, self).__hash__(),
-                self.domain,
-                self.service,
-                self.entity_id,
-            )
-        )
+    def _make_key(self):
+        entity_id = self.entity_id
+        if isinstance(entity_id, list):
+            entity_id = tuple(entity_id)
+        return super(Command, self)._make_key() + (self.domain, self.service, entity_id)
 
     @property
     def domain(self):
@@ -226,10 +329,21 @@ class Command(home.protocol.Command, Description):
     def make_msgs_from(self, old_state, new_state):
         return []
 
+    def with_service_data(self, **service_data):
+        """
+        Make a copy of this command with the given service data fields,
+        leaving this command untouched.
+        """
+        message = self.message
+        for key, value in service_data.items():
+            message = replace(message, ("service_data", key), value)
+        command = self.__class__(message)
+        command._templates = self._templates
+        return command
+
     @classmethod
     def make(cls, entity_id):
-        message = copy.deepcopy(cls.Message)
-        message["service_data"]["entity_id"] = entity_id
+        message = replace(cls.Message, ("service_data", "entity_id"), entity_id)
         return cls(message)
 
     def __repr__(self, *args, **kwargs):
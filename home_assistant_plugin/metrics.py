@@ -0,0 +1,110 @@
+import bisect
+import collections
+
+
+class Histogram:
+    """
+    Counts observed values in fixed buckets.
+
+    >>> histogram = Histogram()
+    >>> for value in [0.5, 3, 3, 7, 40, 900]:
+    ...     histogram.observe(value)
+    >>> histogram.count, histogram.percentile(50), histogram.percentile(99)
+    (6, 5, 1000)
+    >>> str(histogram)
+    'count 6, mean 158.92, p50 <= 5, p99 <= 1000'
+    """
+
+    BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float("inf"))
+
+    def __init__(self, buckets=BUCKETS):
+        """
+        :param buckets: the sorted bucket upper bounds
+        """
+        self._buckets = buckets
+        self._counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        self._counts[bisect.bisect_left(self._buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def percentile(self, percent):
+        """
+        :return: the upper bound of the bucket holding the given percentile
+        """
+        rank = self.count * percent / 100
+        seen = 0
+        for bound, count in zip(self._buckets, self._counts):
+            seen += count
+            if seen >= rank and count:
+                return bound
+        return self._buckets[-1]
+
+    def __str__(self):
+        return "count {}, mean {:.2f}, p50 <= {}, p99 <= {}".format(
+            self.count,
+            self.sum / self.count if self.count else 0,
+            self.percentile(50),
+            self.percentile(99),
+        )
+
+
+class Metrics:
+    """
+    Counters, gauges and histograms collected by the Gateway while running.
+
+    >>> metrics = Metrics()
+    >>> metrics.increment("frames received")
+    >>> metrics.increment("frames received", 2)
+    >>> metrics["frames received"]
+    3
+    >>> metrics.gauge("subscribed entities", 4)
+    >>> metrics["subscribed entities"]
+    4
+    >>> metrics["never seen"]
+    0
+    >>> metrics.observe("round trip ms light.turn_on", 12)
+    >>> metrics["round trip ms light.turn_on"].count
+    1
+    >>> metrics.snapshot()
+    {'frames received': 3, 'subscribed entities': 4, 'round trip ms light.turn_on': 'count 1, mean 12.00, p50 <= 20, p99 <= 20'}
+    """
+
+    def __init__(self):
+        self._counters = collections.Counter()
+        self._gauges = dict()
+        self._histograms = dict()
+
+    def increment(self, name, value=1):
+        self._counters[name] += value
+
+    def gauge(self, name, value):
+        self._gauges[name] = value
+
+    def observe(self, name, value):
+        if name not in self._histograms:
+            self._histograms[name] = Histogram()
+        self._histograms[name].observe(value)
+
+    def __getitem__(self, name):
+        if name in self._gauges:
+            return self._gauges[name]
+        if name in self._histograms:
+            return self._histograms[name]
+        return self._counters[name]
+
+    def snapshot(self):
+        snapshot = dict(self._counters)
+        snapshot.update(self._gauges)
+        snapshot.update(
+            (name, str(histogram)) for name, histogram in self._histograms.items()
+        )
+        return snapshot
+
+    def __str__(self):
+        return ", ".join(
+            "{}: {}".format(name, value) for name, value in self.snapshot().items()
+        )
@@ -0,0 +1,249 @@
+import asyncio
+import collections
+import itertools
+
+from home_assistant_plugin.metrics import Metrics
+
+
+class Outbox:
+    """
+    Messages waiting to be sent by the Gateway writer task.
+
+    A queued message is superseded by a later one with the same key,
+    which takes its place at the end of the queue and the futures waiting for its result.
+
+    >>> import asyncio
+    >>> outbox = Outbox()
+    >>> outbox.put({"volume_level": 0.1}, ("media_player", "volume_set", "media_player.bath"))
+    >>> outbox.put({"service": "media_play"}, ("media_player", "media_play", "media_player.bath"))
+    >>> outbox.put({"volume_level": 0.2}, ("media_player", "volume_set", "media_player.bath"))
+    >>> outbox.put({"message": "hello"})
+    >>> len(outbox)
+    3
+    >>> [msg for msg, _ in asyncio.run(outbox.get(limit=2))]
+    [{'service': 'media_play'}, {'volume_level': 0.2}]
+    >>> asyncio.run(outbox.get())
+    [({'message': 'hello'}, [])]
+    >>> outbox.metrics["commands queued"], outbox.metrics["commands superseded"]
+    (0, 1)
+
+    At most *limit* messages wait, the oldest ones are dropped
+
+    >>> outbox = Outbox(limit=2)
+    >>> for n in range(3):
+    ...     outbox.put({"message": n})
+    >>> [msg for msg, _ in asyncio.run(outbox.get())]
+    [{'message': 1}, {'message': 2}]
+    >>> outbox.metrics["commands dropped"]
+    1
+
+    Messages which could not be sent are put back at the head of the queue,
+    unless superseded meanwhile
+
+    >>> outbox = Outbox()
+    >>> outbox.put({"volume_level": 0.1}, ("media_player", "volume_set", "media_player.bath"))
+    >>> outbox.put({"service": "media_play"}, ("media_player", "media_play", "media_player.bath"))
+    >>> taken = asyncio.run(outbox.get())
+    >>> outbox.put({"volume_level": 0.2}, ("media_player", "volume_set", "media_player.bath"))
+    >>> outbox.requeue(taken)
+    >>> [msg for msg, _ in asyncio.run(outbox.get())]
+    [{'service': 'media_play'}, {'volume_level': 0.2}]
+
+    Messages with the same merge key, queued within *merge_window* seconds,
+    are merged in a single one waited by all of their futures
+
+    >>> def merge(msgs):
+    ...     return {"service": msgs[0]["service"], "entity_id": [msg["entity_id"] for msg in msgs]}
+    >>> def put(outbox, service, entity_id, future=None):
+    ...     msg = {"service": service, "entity_id": entity_id}
+    ...     outbox.put(msg, (service, entity_id), future, service, [entity_id])
+    >>> async def main():
+    ...     outbox = Outbox(merge=merge, merge_window=0.01)
+    ...     futures = [asyncio.get_event_loop().create_future() for _ in range(3)]
+    ...     put(outbox, "turn_on", "light.a", futures[0])
+    ...     put(outbox, "turn_on", "light.b", futures[1])
+    ...     put(outbox, "turn_off", "light.c", futures[2])
+    ...     entries = await outbox.get()
+    ...     return [(msg, len(futures)) for msg, futures in entries], outbox.metrics
+    >>> entries, metrics = asyncio.run(main())
+    >>> entries
+    [({'service': 'turn_on', 'entity_id': ['light.a', 'light.b']}, 2), ({'service': 'turn_off', 'entity_id': 'light.c'}, 1)]
+    >>> metrics["commands merged"]
+    1
+
+    The limit applies to the merged messages, so that taking one at a time still merges
+
+    >>> async def main():
+    ...     outbox = Outbox(merge=merge, merge_window=0.01)
+    ...     put(outbox, "turn_on", "light.a")
+    ...     put(outbox, "turn_off", "light.c")
+    ...     put(outbox, "turn_on", "light.b")
+    ...     return [msg for msg, _ in await outbox.get(limit=1)], len(outbox)
+    >>> asyncio.run(main())
+    ([{'service': 'turn_on', 'entity_id': ['light.a', 'light.b']}], 1)
+
+    A message is never merged ahead of an earlier one of another group targeting
+    the same entities, it starts a new group instead
+
+    >>> async def main(limit=None):
+    ...     outbox = Outbox(merge=merge, merge_window=0.01)
+    ...     put(outbox, "turn_on", "light.b")
+    ...     put(outbox, "turn_off", "light.a")
+    ...     put(outbox, "turn_on", "light.a")
+    ...     return [msg for msg, _ in await outbox.get(limit)], len(outbox)
+    >>> asyncio.run(main())
+    ([{'service': 'turn_on', 'entity_id': 'light.b'}, {'service': 'turn_off', 'entity_id': 'light.a'}, {'service': 'turn_on', 'entity_id': 'light.a'}], 0)
+    >>> asyncio.run(main(limit=1))
+    ([{'service': 'turn_on', 'entity_id': 'light.b'}], 2)
+    """
+
+    def __init__(
+        self, supersede=True, limit=None, metrics=None, merge=None, merge_window=0
+    ):
+        """
+        :param supersede: replace queued messages with later ones with the same key
+        :param limit: how many messages can wait at most, i.e. while disconnected, unlimited when None
+        :param metrics: where to count queued, superseded, dropped and merged messages
+        :param merge: a function making a single message from a list of messages
+        with the same merge key, None to never merge
+        :param merge_window: seconds the first queued message waits for others to merge with
+        """
+        self._supersede = supersede
+        self._limit = limit
+        self._merge = merge
+        self._merge_window = merge_window
+        self._msgs = collections.OrderedDict()
+        self._counter = itertools.count()
+        self._not_empty = None
+        # the keys of the messages taken by the last get, by message identity
+        self._taken = dict()
+        self.metrics = metrics if metrics is not None else Metrics()
+
+    def __len__(self):
+        return len(self._msgs)
+
+    def put(self, msg, key=None, future=None, merge_key=None, entity_ids=()):
+        """
+        :param msg: a message
+        :param key: the key of the messages superseding each other, None for a message never superseded
+        :param future: a future waiting for the message result
+        :param merge_key: the key of the messages that can be merged, None for a message never merged
+        :param entity_ids: the entity ids the message targets, a merged message is never sent
+        ahead of an earlier one targeting any of them
+        """
+        futures = [future] if future is not None else []
+        if key is None or not self._supersede:
+            key = (None, next(self._counter))
+        elif key in self._msgs:
+            futures = self._msgs.pop(key)[1] + futures
+            self.metrics.increment("commands superseded")
+        self._msgs[key] = (msg, futures, merge_key, entity_ids)
+        self._drop_overflow()
+        self.metrics.gauge("commands queued", len(self._msgs))
+        if self._not_empty is not None:
+            self._not_empty.set()
+
+    def _drop_overflow(self):
+        while self._limit is not None and len(self._msgs) > self._limit:
+            _, (_, dropped, _, _) = self._msgs.popitem(last=False)
+            self.metrics.increment("commands dropped")
+            for future in dropped:
+                if not future.done():
+                    future.set_exception(OverflowError("too many queued commands"))
+
+    def requeue(self, entries):
+        """
+        Put back at the head of the queue messages taken by the last *get*
+        which could not be sent, i.e. because the connection was lost.
+
+        A message queued meanwhile with the same key supersedes the one put back.
+
+        :param entries: a list of (message, futures) in queue order
+        """
+        queued = self._msgs
+        self._msgs = collections.OrderedDict()
+        for msg, futures in entries:
+            key, merge_key, entity_ids = self._taken.get(
+                id(msg), ((None, next(self._counter)), None, ())
+            )
+            if key in queued:
+                later, later_futures, later_merge_key, later_entity_ids = queued[key]
+                queued[key] = (
+                    later,
+                    futures + later_futures,
+                    later_merge_key,
+                    later_entity_ids,
+                )
+                self.metrics.increment("commands superseded")
+            else:
+                self._msgs[key] = (msg, futures, merge_key, entity_ids)
+        self._msgs.update(queued)
+        self._drop_overflow()
+        self.metrics.gauge("commands queued", len(self._msgs))
+        if self._msgs and self._not_empty is not None:
+            self._not_empty.set()
+
+    async def get(self, limit=None):
+        """
+        Wait for queued messages and take them out of the queue.
+
+        :param limit: how many messages to take at most, all of them when None,
+        counted once merged
+        :return: a list of (message, futures) in queue order
+        """
+        while not self._msgs:
+            if self._not_empty is None:
+                self._not_empty = asyncio.Event()
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        if self._merge is not None and self._merge_window:
+            await asyncio.sleep(self._merge_window)
+        if self._merge is None:
+            groups = [[key] for key in itertools.islice(self._msgs, limit)]
+        else:
+            groups = self._groups(limit)
+        merged = list()
+        self._taken = dict()
+        for keys in groups:
+            group = list()
+            for key in keys:
+                msg, futures, merge_key, entity_ids = self._msgs.pop(key)
+                self._taken[id(msg)] = (key, merge_key, entity_ids)
+                group.append((msg, futures))
+            merged.append(self._merged(group))
+        self.metrics.gauge("commands queued", len(self._msgs))
+        return merged
+
+    def _groups(self, limit):
+        # the keys of the first *limit* merge groups, in the order of their first message,
+        # so that the limit applies to the merged messages;
+        # a message joins the group of its merge key only when no message of a later group,
+        # queued before it, targets one of its entity ids, otherwise it starts a new one
+        groups = list()
+        merging = dict()
+        # the latest group targeting each entity id
+        latest = dict()
+        for key, (_, _, merge_key, entity_ids) in self._msgs.items():
+            position = merging.get(merge_key) if merge_key is not None else None
+            if position is not None and any(
+                latest.get(entity_id, -1) > position for entity_id in entity_ids
+            ):
+                position = None
+            if position is None:
+                position = len(groups)
+                groups.append(list())
+                if merge_key is not None:
+                    merging[merge_key] = position
+            groups[position].append(key)
+            for entity_id in entity_ids:
+                latest[entity_id] = max(latest.get(entity_id, -1), position)
+        return groups[:limit]
+
+    def _merged(self, group):
+        if len(group) == 1:
+            return group[0]
+        self.metrics.increment("commands merged", len(group) - 1)
+        return (
+            self._merge([msg for msg, _ in group]),
+            [future for _, futures in group for future in futures],
+        )
@@ -0,0 +1,67 @@
+import re
+
+# the head of a single state_changed event, with its fields in the order
+# Home Assistant serializes them, up to the entity id of its data
+EVENT = (
+    r'\s*\{\s*"id"\s*:\s*\d+\s*,\s*"type"\s*:\s*"event"\s*,\s*"event"\s*:\s*\{'
+    r'\s*"event_type"\s*:\s*"state_changed"\s*,\s*"data"\s*:\s*\{'
+    r'\s*"entity_id"\s*:\s*"([^"\\]*)"'
+)
+
+
+class Prefilter:
+    """
+    Scans the head of the raw websocket frames, so that the *state_changed* events
+    of entities without triggers are dropped before being decoded,
+    whatever the size of their states.
+
+    A frame is skipped only when it surely is one of those events:
+    every other frame, coalesced ones and events with their fields
+    in another order included, is decoded as usual.
+
+    >>> prefilter = Prefilter({"sensor.wind"})
+    >>> def frame(entity_id, attributes="{}"):
+    ...     return (
+    ...         '{"id": 3, "type": "event", "event": {"event_type": "state_changed", '
+    ...         '"data": {"entity_id": "%s", "new_state": {"entity_id": "%s", '
+    ...         '"state": "2", "attributes": %s}}}}' % (entity_id, entity_id, attributes)
+    ...     )
+    >>> prefilter.skips(frame("sensor.wind")), prefilter.skips(frame("light.bath"))
+    (False, True)
+    >>> prefilter.skips(frame("light.bath").encode())
+    True
+    >>> prefilter.skips(frame("light.bath", '{"followed": {"entity_id": "sensor.wind"}}'))
+    True
+    >>> prefilter.skips('[' + frame("light.bath") + ']')
+    False
+    >>> prefilter.skips('{"id": 4, "type": "result", "success": true, "result": '
+    ...                 '[{"entity_id": "light.bath", "state": "on"}]}')
+    False
+    """
+
+    _EVENT = re.compile(EVENT)
+    _BINARY_EVENT = re.compile(EVENT.encode())
+
+    def __init__(self, entity_ids):
+        """
+        :param entity_ids: the tracked entity ids, a set shared with the Gateway
+        and so following its associated triggers
+        """
+        self._entity_ids = entity_ids
+
+    def skips(self, data):
+        """
+        :param data: a str or bytes websocket frame
+        :return: True when the frame is a state_changed event of an untracked entity
+        """
+        if isinstance(data, str):
+            found = self._EVENT.match(data)
+            if found is None:
+                return False
+            entity_id = found.group(1)
+        else:
+            found = self._BINARY_EVENT.match(data)
+            if found is None:
+                return False
+            entity_id = found.group(1).decode()
+        return entity_id not in self._entity_ids
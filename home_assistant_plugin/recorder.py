@@ -0,0 +1,49 @@
+import gzip
+import time
+
+
+class Recorder:
+    """
+    Appends raw websocket frames, with their monotonic arrival time,
+    to a gzip compressed file.
+
+    >>> import os
+    >>> import tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), "frames.gz")
+    >>> recorder = Recorder(path)
+    >>> recorder.write('{"type": "auth_required"}')
+    >>> recorder.write(b'{"type": "auth_ok"}')
+    >>> recorder.close()
+    >>> [frame for _, frame in read(path)]
+    ['{"type": "auth_required"}', '{"type": "auth_ok"}']
+    """
+
+    def __init__(self, path):
+        """
+        :param path: the recording file, appended if it already exists
+        """
+        self._file = gzip.open(path, "at", encoding="utf-8")
+
+    def write(self, frame):
+        """
+        :param frame: a str or bytes websocket frame
+        """
+        if isinstance(frame, bytes):
+            frame = frame.decode("utf-8")
+        self._file.write("{:.6f}\t{}\n".format(time.monotonic(), frame))
+
+    def close(self):
+        self._file.close()
+
+
+def read(path):
+    """
+    Read back a recording.
+
+    :param path: the recording file
+    :return: an iterator of (monotonic arrival time, frame)
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            timestamp, frame = line.rstrip("\n").split("\t", 1)
+            yield float(timestamp), frame
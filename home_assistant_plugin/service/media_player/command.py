@@ -89,6 +89,8 @@ class VolumeSet(Parent):
     'volume_set'
     >>> msg[0].message["service_data"]["volume_level"]
     15
+    >>> cmd.message["service_data"]["volume_level"]
+    0.1
     """
 
     Message = {
@@ -101,14 +103,15 @@ class VolumeSet(Parent):
         },
     }
 
+    Variables = ("volume_level",)
+
     def make_msgs_from(
         self,
         old_state: home.appliance.attribute.mixin.Volume,
         new_state: home.appliance.attribute.mixin.Volume,
     ):
-        self.message["service_data"]["volume_level"] = new_state.volume
-        result = self.execute()
-        return result
+        command = self.with_service_data(volume_level=new_state.volume)
+        return command.execute()
 
 
 class ShuffleSet(Parent):
@@ -164,11 +167,12 @@ class SelectSource(Parent):
         },
     }
 
+    Variables = ("source",)
+
     def make_msgs_from(
         self,
         old_state: home.appliance.attribute.mixin.Playlist,
         new_state: home.appliance.attribute.mixin.Playlist,
     ):
-        self.message["service_data"]["source"] = new_state.playlist
-        result = self.execute()
-        return result
+        command = self.with_service_data(source=new_state.playlist)
+        return command.execute()
@@ -4,24 +4,12 @@ from home_assistant_plugin.service.trigger import Equals
 
 class Factory:
     def __init__(self, setup_triggers):
-        self._setup_triggers = setup_triggers
+        self._entity_ids = {trigger.entity_id for trigger in setup_triggers}
 
-    def get_triggers_from(self, message):
-        state = None
-        triggers = list()
-
-        try:
-            state = message["event"]["data"]["new_state"]["state"]
-        except (KeyError, TypeError):
-            pass
-
-        if state == "playing":
-            triggers.append(Playing(message))
-
-        if state == "paused":
-            triggers.append(Paused(message))
-
-        return triggers
+    def index(self):
+        for entity_id in self._entity_ids:
+            yield entity_id, "playing", Playing
+            yield entity_id, "paused", Paused
 
 
 class Playing(Equals):
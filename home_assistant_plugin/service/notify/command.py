@@ -1,5 +1,3 @@
-import copy
-
 import home
 from home_assistant_plugin.message import Description
 
@@ -30,8 +28,11 @@ class Command(Description, home.protocol.Command):
         "service_data": {"message": "none", "title": "none", "target": [], "data": {}},
     }
 
+    Variables = ()
+
     def __init__(self, message):
         super(Command, self).__init__(message)
+        self._templates = dict()
         if message["type"] == self.Message["type"]:
             self._domain = message["domain"]
             self._service = message["service"]
@@ -54,26 +55,12 @@ class Command(Description, home.protocol.Command):
                 'it should be of type "event"'.format(message)
             )
 
-    def __eq__(self, other):
-        if super(Command, self).__eq__(other):
-            if (
-                self.notify_message == other.notify_message
-                and self.title == other.title
-                and self.domain == other.domain
-                and self.service == other.service
-            ):
-                return True
-        return False
-
-    def __hash__(self):
-        return hash(
-            "{}{}{}{}{}".format(
-                super(Command, self).__hash__(),
-                self.domain,
-                self.service,
-                self.message,
-                self.title,
-            )
+    def _make_key(self):
+        return super(Command, self)._make_key() + (
+            self.domain,
+            self.service,
+            self.notify_message,
+            self.title,
         )
 
     @property
@@ -101,11 +88,14 @@ class Command(Description, home.protocol.Command):
 
     @classmethod
     def make(cls, message: str, title: str, target: list, data: dict) -> "Command":
-        msg = copy.deepcopy(cls.Message)
-        msg["service_data"]["message"] = message
-        msg["service_data"]["title"] = title
-        msg["service_data"]["target"] = target
-        msg["service_data"]["data"] = data
+        msg = dict(cls.Message)
+        msg["service_data"] = dict(
+            cls.Message["service_data"],
+            message=message,
+            title=title,
+            target=target,
+            data=data,
+        )
         return cls(msg)
 
     @classmethod
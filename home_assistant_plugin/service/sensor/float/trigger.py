@@ -1,18 +1,188 @@
+import time
+
 import home
-from home_assistant_plugin.message import Trigger
+from home_assistant_plugin.message import Trigger, replace
+from home_assistant_plugin.metrics import Metrics
+from home_assistant_plugin.window import Window
 from home_assistant_plugin.service.sensor.trigger import FloatMixin
 from home_assistant_plugin.service.trigger import (
+    NOT_A_NUMBER,
+    OnceMixin,
     GreaterThan as GTParent,
     LesserThan as LTParent,
     InBetween as IBParent,
 )
 
 
-class Always(FloatMixin, Trigger, home.protocol.mean.Mixin):
+class Always(FloatMixin, OnceMixin, Trigger, home.protocol.mean.Mixin):
+    """
+    Triggered by every numeric sample, its value is the sample itself.
+
+    A setup trigger with a *window* aggregates the samples instead, its value
+    is the aggregate of the window. With *every* it triggers at most once
+    in that many seconds, the samples in between only feed the window, if any,
+    and are counted in *metrics*.
+
+    >>> import home_assistant_plugin
+    >>> def make(state):
+    ...     return Always.make_from_state("sensor.power", state, {})
+    >>> now = [0]
+    >>> power = Always.make("sensor.power", samples=3, aggregate="max", every=10)
+    >>> power._clock = lambda: now[0]
+    >>> def received(seconds, state):
+    ...     now[0] = seconds
+    ...     trigger = make(state)
+    ...     return power.is_triggered(trigger) and power.get_value(trigger)
+    >>> [received(*sample) for sample in ((0, "100"), (4, "300"), (8, "200"), (11, "150"))]
+    [100.0, False, False, 300.0]
+    >>> power.metrics["samples aggregated sensor.power"]
+    2
+    >>> power.state
+    NOT_A_NUMBER
+    >>> power = Always.make("sensor.power", every=10)
+    >>> power._clock = lambda: now[0]
+    >>> [received(*sample) for sample in ((20, "100"), (24, "300"), (31, "150"))]
+    [100.0, False, 150.0]
+    >>> power.metrics["samples throttled sensor.power"]
+    1
+    >>> power == Always.make("sensor.power", every=30), power == Always.make("sensor.power")
+    (False, False)
+
+    Only the received Always Triggers feed the window, those of other classes
+    built for the same message carry the same sample
+
+    >>> import home_assistant_plugin
+    >>> float_trigger = home_assistant_plugin.service.sensor.float.trigger
+    >>> power = Always.make("sensor.power", samples=10, aggregate="max")
+    >>> factory = home_assistant_plugin.factory.trigger.Factory({
+    ...     power,
+    ...     float_trigger.GreaterThan.make("sensor.power", value=100),
+    ...     home_assistant_plugin.service.sensor.trigger.On.make("sensor.power"),
+    ... })
+    >>> def make_message(state):
+    ...     return {"type": "event", "event": {"event_type": "state_changed", "data": {
+    ...         "entity_id": "sensor.power",
+    ...         "new_state": {"entity_id": "sensor.power", "state": state, "attributes": {}}}}}
+    >>> for state in ("50", "150"):
+    ...     triggers = factory.get_triggers_from(make_message(state))
+    ...     fired = [power.is_triggered(trigger) for trigger in triggers]
+    >>> len(triggers), fired.count(True), len(power._window), power.get_value(triggers[0])
+    (3, 1, 2, 150.0)
+    >>> power = Always.make("sensor.power", seconds=60)
+    >>> [power.is_triggered(make(state)) and power.get_value(make(state))
+    ...  for state in ("100", "unavailable", "300")]
+    [100.0, False, 200.0]
+    """
+
+    _window = None
+    _samples = None
+    _seconds = None
+    _aggregate = "mean"
+    _every = None
+    _clock = staticmethod(time.monotonic)
+
+    def __init__(
+        self,
+        message,
+        events=None,
+        samples=None,
+        seconds=None,
+        aggregate="mean",
+        every=None,
+    ):
+        """
+        :param samples: aggregate the latest samples, at most this many
+        :param seconds: aggregate the samples of the latest seconds
+        :param aggregate: mean, min, max or a percentile like p95
+        :param every: seconds between two triggers at least, the cadence
+        of the aggregated values
+        """
+        super(Always, self).__init__(message, events)
+        if samples is not None or seconds is not None:
+            if not Window.is_aggregate(aggregate):
+                raise ValueError("unknown aggregate {}".format(aggregate))
+            self._window = Window(samples, seconds)
+        self._samples = samples
+        self._seconds = seconds
+        self._aggregate = aggregate
+        self._every = every
+        self.metrics = Metrics()
+        self._emitted_at = None
+        self._aggregated = None
+
+    def _make_key(self):
+        return super(Always, self)._make_key() + (
+            self._samples,
+            self._seconds,
+            self._aggregate,
+            self._every,
+        )
+
+    @classmethod
+    def make(
+        cls,
+        entity_id,
+        events=None,
+        samples=None,
+        seconds=None,
+        aggregate="mean",
+        every=None,
+    ):
+        message = replace(cls.Message, ("event", "data", "entity_id"), entity_id)
+        return cls(message, events, samples, seconds, aggregate, every)
+
+    @classmethod
+    def make_from_yaml(
+        cls,
+        entity_id,
+        events=None,
+        samples=None,
+        seconds=None,
+        aggregate="mean",
+        every=None,
+    ):
+        return cls.make(entity_id, events, samples, seconds, aggregate, every)
+
+    def is_triggered(self, another_description):
+        # a mean over non numeric states makes no sense
+        triggered = (
+            super(Always, self).is_triggered(another_description)
+            and another_description.state is not NOT_A_NUMBER
+        )
+        if not triggered or (self._window is None and not self._every):
+            return triggered
+        if not isinstance(another_description, self.__class__):
+            # the Triggers of the other classes carry the same samples
+            return False
+        return self._evaluate_once(another_description, self._sample)
+
+    def _sample(self, another_description):
+        now = self._clock()
+        if self._window is not None:
+            self._window.add(another_description.state, now)
+        if (
+            self._every
+            and self._emitted_at is not None
+            and now - self._emitted_at < self._every
+        ):
+            self.metrics.increment(
+                "samples {} {}".format(
+                    "throttled" if self._window is None else "aggregated",
+                    self.entity_id,
+                )
+            )
+            return False
+        self._emitted_at = now
+        if self._window is not None:
+            self._aggregated = self._window.aggregate(self._aggregate)
+        return True
+
     def get_value(
         self, description: "home_assistant_plugin.message.Description"
     ) -> float:
-        return float(description.state)
+        if self._window is not None:
+            return self._aggregated
+        return description.state
 
 
 class GreaterThan(FloatMixin, GTParent):
@@ -1,40 +1,52 @@
-from home_assistant_plugin.service.trigger import Equals
+from home_assistant_plugin.service.trigger import Equals, NOT_A_NUMBER
 
 
 class Factory:
     def __init__(self, setup_triggers):
-        self._entity_id_klass = {}
-        for trigger in setup_triggers:
-            if trigger.entity_id not in self._entity_id_klass:
-                self._entity_id_klass[trigger.entity_id] = list()
-            self._entity_id_klass[trigger.entity_id].append(trigger.__class__)
+        self._setup_triggers = setup_triggers
 
-    def get_triggers_from(self, message):
-        entity_id = None
-        triggers = list()
+    def index(self):
+        for trigger in self._setup_triggers:
+            yield trigger.entity_id, None, trigger.__class__
 
-        try:
-            entity_id = message["event"]["data"]["entity_id"]
-        except (KeyError, TypeError):
-            pass
 
-        if entity_id in self._entity_id_klass:
-            for klass in self._entity_id_klass[entity_id]:
-                triggers.append(klass(message))
+class NumericMixin:
+    """
+    A state parsed once, on first access, NOT_A_NUMBER when it is not a number.
 
-        return triggers
+    Subclasses choose the parsing function with *_parse*, float by default.
 
+    >>> import home_assistant_plugin
+    >>> trigger = home_assistant_plugin.service.sensor.float.trigger.Always.make_from_state(
+    ...     "sensor.power", "unavailable", {}
+    ... )
+    >>> trigger.state, trigger.is_numeric
+    (NOT_A_NUMBER, False)
+    """
+
+    _value = None
+    _parse = staticmethod(float)
 
-class IntMixin:
     @property
     def state(self):
-        return int(self._state)
-
+        if self._value is None:
+            try:
+                self._value = self._parse(self._state)
+            except (TypeError, ValueError):
+                self._value = NOT_A_NUMBER
+        return self._value
 
-class FloatMixin:
     @property
-    def state(self):
-        return float(self._state)
+    def is_numeric(self):
+        return self.state is not NOT_A_NUMBER
+
+
+class IntMixin(NumericMixin):
+    _parse = staticmethod(int)
+
+
+class FloatMixin(NumericMixin):
+    _parse = staticmethod(float)
 
 
 class On(Equals):
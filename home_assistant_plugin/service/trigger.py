@@ -1,5 +1,56 @@
-import copy
-from home_assistant_plugin.message import Trigger
+import functools
+import logging
+import time
+
+from home_assistant_plugin.message import Trigger, replace
+from home_assistant_plugin.metrics import Metrics
+
+
+class NotANumber:
+    """
+    The parsed value of a numeric state like *unavailable* or *unknown*.
+    """
+
+    def __repr__(self):
+        return "NOT_A_NUMBER"
+
+
+NOT_A_NUMBER = NotANumber()
+
+
+class OnceMixin:
+    """
+    Evaluates a received Trigger once, however many times it is asked,
+    so that a setup trigger keeping state is updated once per received value.
+
+    >>> class Counter(OnceMixin):
+    ...     evaluated = 0
+    ...     def is_triggered(self, another_description):
+    ...         return self._evaluate_once(another_description, self._count)
+    ...     def _count(self, another_description):
+    ...         self.evaluated += 1
+    ...         return True
+    >>> counter, received = Counter(), object()
+    >>> counter.is_triggered(received), counter.is_triggered(received), counter.evaluated
+    (True, True, 1)
+    """
+
+    # the last evaluated Trigger and its outcome
+    _last = None
+    _last_triggered = False
+
+    def _evaluate_once(self, another_description, evaluate):
+        """
+        :param another_description: a received Trigger
+        :param evaluate: a function evaluating it, called once per received Trigger
+        :return: the outcome of its evaluation
+        """
+        if another_description is self._last:
+            return self._last_triggered
+        triggered = evaluate(another_description)
+        self._last = another_description
+        self._last_triggered = triggered
+        return triggered
 
 
 class Equals(Trigger):
@@ -127,28 +178,34 @@ class Equals(Trigger):
     >>> match_trigger = home_assistant_plugin.service.trigger.Equals(match_trigger_data)
     >>> trigger.is_triggered(match_trigger)
     True
+    >>> trigger == match_trigger, match_trigger == trigger
+    (True, False)
     >>> str(match_trigger)
     "Triggered entity light.bed_light state on with attributes [{'rgb_color': [254, 208, 0], 'color_temp': 380, 'supported_features': 147, 'xy_color': [0.5, 0.5], 'brightness': 180, 'white_value': 200, 'friendly_name': 'Bed Light'}]"
     """
 
+    # the configured attribute keys, compiled on the first match
+    _keys = None
+
+    def _make_key(self):
+        return super(Equals, self)._make_key() + (self.state,)
+
     def __eq__(self, other):
         if super(Equals, self).__eq__(other):
-            if self.state == other.state and set(
-                [value for key, value in self.attributes.items()]
-            ) == set(
-                [
-                    value
-                    for key, value in other.attributes.items()
-                    if key in self.attributes
-                ]
-            ):
+            if self is other:
                 return True
+            missing = object()
+            return all(
+                other.attributes.get(key, missing) == value
+                for key, value in self.attributes.items()
+            )
         return False
 
     def __hash__(self):
-        return hash(
-            "{}{}{}".format(super(Equals, self).__hash__(), self.entity_id, self.state)
-        )
+        return super(Equals, self).__hash__()
+
+    def projection(self):
+        return frozenset(self.attributes)
 
     def __str__(self, *args, **kwargs):
         s = "Triggered entity {} state {} with attributes [{}]".format(
@@ -158,69 +215,274 @@ class Equals(Trigger):
 
     def is_triggered(self, another_description):
         if super(Equals, self).is_triggered(another_description):
-            other = self.__class__(another_description.message)
-            if self.state == other.state and set(
-                [key for key in self.attributes.keys()]
-            ) == set(
-                [key for key in other.attributes.keys() if key in self.attributes]
+            if self._keys is None:
+                self._keys = frozenset(self.attributes)
+            # the raw states, another description may parse its own
+            if self._state == another_description._state and self._keys.issubset(
+                another_description.attributes
             ):
-                self._logger.info("triggered {}".format(another_description))
+                self._logger.info("triggered %s", another_description)
                 return True
         return False
 
 
-class Comparison(Trigger):
-    def __init__(self, message, events=None, value=None):
+class Comparison(OnceMixin, Trigger):
+    """
+    A numeric threshold, triggered by every received value beyond it.
+
+    A setup trigger can suppress part of those values, so that a sensor hovering
+    around the threshold does not trigger on every sample:
+
+    - *hysteresis*: once triggered, it triggers again only after the value went back
+      past the threshold by this band, 0 to trigger once every time it is crossed
+    - *hold*: seconds the values must keep beyond the threshold before triggering
+    - *throttle*: seconds between two triggers at least
+
+    Suppressed values are counted in *metrics* by reason and entity id.
+
+    Home Assistant sends nothing while a value stays the same, so a held value
+    is evaluated again once its hold expires, through *schedule*: a function
+    called with a delay in seconds and a function making the Trigger to dispatch
+    again then, set by the factory.trigger.Factory of the Gateway.
+    Without it, the hold is checked only when the next value arrives.
+
+    >>> import home_assistant_plugin
+    >>> float_trigger = home_assistant_plugin.service.sensor.float.trigger
+    >>> def make(state):
+    ...     return float_trigger.GreaterThan.make_from_state("sensor.wind", state, {})
+    >>> windy = float_trigger.GreaterThan.make("sensor.wind", value=10, hysteresis=2)
+    >>> [windy.is_triggered(make(value)) for value in ("11", "12", "9", "11", "7", "11")]
+    [True, False, False, False, False, True]
+    >>> windy.metrics["suppressed by hysteresis sensor.wind"]
+    2
+    >>> windy == float_trigger.GreaterThan.make("sensor.wind", value=10)
+    False
+    >>> now = [0]
+    >>> windy = float_trigger.GreaterThan.make("sensor.wind", value=10, hold=5, throttle=60)
+    >>> windy._clock = lambda: now[0]
+    >>> def received(seconds, state):
+    ...     now[0] = seconds
+    ...     return windy.is_triggered(make(state))
+    >>> [received(*sample) for sample in ((0, "11"), (3, "12"), (6, "11"), (30, "13"), (70, "11"))]
+    [False, False, True, False, True]
+    >>> windy.metrics["suppressed by hold sensor.wind"], windy.metrics["suppressed by throttle sensor.wind"]
+    (2, 1)
+
+    A received Trigger is evaluated once, however many times it is asked,
+    so that it is never suppressed by itself
+
+    >>> trigger = make("14")
+    >>> windy.is_triggered(trigger), windy.is_triggered(trigger)
+    (False, False)
+
+    A value crossing the threshold and staying there triggers once held,
+    even when no other value arrives
+
+    >>> scheduled = []
+    >>> windy = float_trigger.GreaterThan.make("sensor.wind", value=10, hold=5)
+    >>> windy._clock = lambda: now[0]
+    >>> windy.schedule = lambda delay, function: scheduled.append((delay, function))
+    >>> received(100, "11")
+    False
+    >>> [delay for delay, _ in scheduled]
+    [5]
+    >>> now[0] = 105
+    >>> again = scheduled[0][1]()
+    >>> again.state, windy.is_triggered(again)
+    (11.0, True)
+    >>> received(106, "9"), received(107, "12"), scheduled[1][0]
+    (False, False, 5)
+    >>> received(108, "8"), scheduled[1][1]() is None
+    (False, True)
+    """
+
+    # the factory.threshold.Region holding the received value, when indexed
+    _region = None
+    _hysteresis = None
+    _hold = None
+    _throttle = None
+    _clock = staticmethod(time.monotonic)
+    # the setup trigger a Trigger is dispatched again for, once its hold expired
+    _held_by = None
+
+    def __init__(
+        self,
+        message,
+        events=None,
+        value=None,
+        hysteresis=None,
+        hold=None,
+        throttle=None,
+    ):
+        """
+        :param hysteresis: the band the value must go back past the threshold by,
+        before triggering again
+        :param hold: seconds the value must keep beyond the threshold before triggering
+        :param throttle: seconds between two triggers at least
+        """
         message = self.override_value(message, value)
         super(Comparison, self).__init__(message, events)
+        self._hysteresis = hysteresis
+        self._hold = hold
+        self._throttle = throttle
+        self._suppressing = hysteresis is not None or bool(hold) or bool(throttle)
+        self.metrics = Metrics()
+        self.schedule = None
+        self._armed = True
+        self._hold_scheduled = False
+        self._entered_at = None
+        self._fired_at = None
 
-    def __eq__(self, other):
-        if super(Comparison, self).__eq__(other):
-            if self.state == other.state:
-                return True
-        return False
-
-    def __hash__(self):
-        return hash(
-            "{}{}{} comparison".format(
-                super(Trigger, self).__hash__(), self.entity_id, self.state
-            )
+    def _make_key(self):
+        return super(Comparison, self)._make_key() + (
+            self.state,
+            self._hysteresis,
+            self._hold,
+            self._throttle,
         )
 
     @staticmethod
     def override_value(message, value=None):
         if value:
-            message["event"]["data"]["new_state"]["state"] = str(value)
+            message = replace(
+                message, ("event", "data", "new_state", "state"), str(value)
+            )
         return message
 
     @classmethod
-    def make(cls, entity_id, events=None, value=None):
-        message = copy.deepcopy(cls.Message)
-        message["event"]["data"]["entity_id"] = entity_id
-        return cls(message, events, value)
+    def make(
+        cls,
+        entity_id,
+        events=None,
+        value=None,
+        hysteresis=None,
+        hold=None,
+        throttle=None,
+    ):
+        message = replace(cls.Message, ("event", "data", "entity_id"), entity_id)
+        return cls(
+            message, events, value, hysteresis=hysteresis, hold=hold, throttle=throttle
+        )
 
     @classmethod
-    def make_from_yaml(cls, entity_id, events=None, value=None):
-        return cls.make(entity_id, events, value)
+    def make_from_yaml(
+        cls,
+        entity_id,
+        events=None,
+        value=None,
+        hysteresis=None,
+        hold=None,
+        throttle=None,
+    ):
+        return cls.make(entity_id, events, value, hysteresis, hold, throttle)
+
+    def projection(self):
+        if self._hold or self._throttle:
+            # the time an unchanged value arrives at may change the outcome
+            return None
+        return frozenset()
+
+    def boundaries(self):
+        """
+        :return: the values where the outcome of *is_triggered_by* may change
+        """
+        return (self.state,)
+
+    def is_triggered_by(self, value):
+        return True
+
+    def is_released_by(self, value):
+        """
+        :return: True when the value went back past the threshold by the hysteresis band
+        """
+        return not self.is_triggered_by(value)
 
     def is_triggered(self, another_description):
         if super(Comparison, self).is_triggered(another_description):
-            triggered = self.__class__ == another_description.__class__
-            return triggered
+            if self.__class__ != another_description.__class__:
+                return False
+            if another_description.state is NOT_A_NUMBER:
+                return False
+            held_by = another_description._held_by
+            if held_by is not None and held_by is not self:
+                return False
+            return self._evaluate_once(another_description, self._evaluate)
         return False
 
-
-class GreaterThan(Comparison):
-    def is_triggered(self, another_description):
-        if super(GreaterThan, self).is_triggered(another_description):
-            triggered = self.state < another_description.state
+    def _evaluate(self, another_description):
+        region = another_description._region
+        if region is not None and region.covers(self):
+            triggered = region.fires(self)
+        else:
+            triggered = self.is_triggered_by(another_description.state)
+        if self._logger.isEnabledFor(logging.DEBUG):
             self._logger.debug(
-                "{} triggered={} {} < {}".format(
-                    self, triggered, self.state, another_description.state
+                "{} triggered={} by {}".format(
+                    self, triggered, another_description.state
                 )
             )
-            return triggered
-        return False
+        if self._suppressing:
+            triggered = self._suppress(triggered, another_description)
+        return triggered
+
+    def _suppress(self, triggered, another_description):
+        now = self._clock()
+        reason = None
+        if not triggered:
+            self._entered_at = None
+            self._hold_scheduled = False
+            if not self._armed and self.is_released_by(another_description.state):
+                self._armed = True
+        else:
+            if self._entered_at is None:
+                self._entered_at = now
+            if not self._armed:
+                reason = "hysteresis"
+            elif self._hold and now - self._entered_at < self._hold:
+                reason = "hold"
+                if self.schedule is not None and not self._hold_scheduled:
+                    self._hold_scheduled = True
+                    self.schedule(
+                        self._hold - (now - self._entered_at),
+                        functools.partial(self._hold_expired, self._entered_at),
+                    )
+            elif (
+                self._throttle
+                and self._fired_at is not None
+                and now - self._fired_at < self._throttle
+            ):
+                reason = "throttle"
+            else:
+                self._fired_at = now
+                if self._hysteresis is not None:
+                    self._armed = False
+        if reason is not None:
+            self.metrics.increment("suppressed by {} {}".format(reason, self.entity_id))
+            triggered = False
+        return triggered
+
+    def _hold_expired(self, entered_at):
+        """
+        :return: a Trigger of the latest value to evaluate again,
+        None when the value went back or already triggered meanwhile
+        """
+        self._hold_scheduled = False
+        if self._entered_at != entered_at or self._last is None:
+            return None
+        if self._fired_at is not None and self._fired_at >= entered_at:
+            return None
+        last = self._last
+        trigger = last.make_from_state(last.entity_id, last._state, last.attributes)
+        trigger._held_by = self
+        return trigger
+
+
+class GreaterThan(Comparison):
+    def is_triggered_by(self, value):
+        return self.state < value
+
+    def is_released_by(self, value):
+        return value <= self.state - (self._hysteresis or 0)
 
     def __str__(self):
         s = super(GreaterThan, self).__str__()
@@ -228,16 +490,11 @@ class GreaterThan(Comparison):
 
 
 class LesserThan(Comparison):
-    def is_triggered(self, another_description):
-        if super(LesserThan, self).is_triggered(another_description):
-            triggered = self.state > another_description.state
-            self._logger.debug(
-                "{} triggered={} {} > {}".format(
-                    self, triggered, self.state, another_description.state
-                )
-            )
-            return triggered
-        return False
+    def is_triggered_by(self, value):
+        return self.state > value
+
+    def is_released_by(self, value):
+        return value >= self.state + (self._hysteresis or 0)
 
     def __str__(self):
         s = super(LesserThan, self).__str__()
@@ -245,27 +502,37 @@ class LesserThan(Comparison):
 
 
 class InBetween(Comparison):
-    def __init__(self, message, events=None, value=None, range=None):
+
+    _range = 1
+
+    def __init__(
+        self,
+        message,
+        events=None,
+        value=None,
+        range=None,
+        hysteresis=None,
+        hold=None,
+        throttle=None,
+    ):
         message = self.override_value(message, value)
-        super(InBetween, self).__init__(message, events, value)
+        super(InBetween, self).__init__(
+            message, events, value, hysteresis=hysteresis, hold=hold, throttle=throttle
+        )
         self._range = range if range else 1
 
-    def is_triggered(self, another_description):
-        if super(InBetween, self).is_triggered(another_description):
-            triggered = (
-                self.state < another_description.state < (self.state + self._range)
-            )
-            self._logger.debug(
-                "{} triggered={} {} < {} < {}".format(
-                    self,
-                    triggered,
-                    self.state,
-                    another_description.state,
-                    (self.state + self._range),
-                )
-            )
-            return triggered
-        return False
+    def _make_key(self):
+        return super(InBetween, self)._make_key() + (self._range,)
+
+    def boundaries(self):
+        return (self.state, self.state + self._range)
+
+    def is_triggered_by(self, value):
+        return self.state < value < (self.state + self._range)
+
+    def is_released_by(self, value):
+        band = self._hysteresis or 0
+        return value <= self.state - band or value >= self.state + self._range + band
 
     def __str__(self):
         s = super(InBetween, self).__str__()
@@ -0,0 +1,127 @@
+from home_assistant_plugin.metrics import Metrics
+
+
+class States:
+    """
+    A local mirror of the Home Assistant entity states, seeded by a *get_states* result
+    and kept up to date by the *state_changed* events.
+
+    Only the state and the selected attributes of the tracked entities are kept.
+
+    >>> states = States({"sensor.temperature": {"unit_of_measurement"}})
+    >>> changed = states.seed([
+    ...     {"entity_id": "sensor.temperature", "state": "21.5",
+    ...      "attributes": {"unit_of_measurement": "°C", "friendly_name": "Temperature"}},
+    ...     {"entity_id": "sensor.humidity", "state": "40", "attributes": {}},
+    ... ])
+    >>> changed
+    ['sensor.temperature']
+    >>> states["sensor.temperature"]
+    {'entity_id': 'sensor.temperature', 'state': '21.5', 'attributes': {'unit_of_measurement': '°C'}}
+    >>> "sensor.humidity" in states
+    False
+    >>> states.update({
+    ...     "type": "event",
+    ...     "event": {
+    ...         "event_type": "state_changed",
+    ...         "data": {
+    ...             "entity_id": "sensor.temperature",
+    ...             "new_state": {"entity_id": "sensor.temperature", "state": "22", "attributes": {}},
+    ...         },
+    ...     },
+    ... })
+    >>> states.get("sensor.temperature")["state"]
+    '22'
+    >>> states.make_event("sensor.temperature")["event"]["data"]["new_state"]["state"]
+    '22'
+    >>> states.seed([{"entity_id": "sensor.temperature", "state": "22", "attributes": {}}])
+    []
+    """
+
+    def __init__(self, attribute_keys=None, metrics=None):
+        """
+        :param attribute_keys: maps the tracked entity ids to the attribute keys to keep,
+        every entity with all of its attributes is tracked when None
+        :param metrics: where to gauge the tracked entities
+        """
+        self.attribute_keys = attribute_keys
+        self._states = dict()
+        self.metrics = metrics if metrics is not None else Metrics()
+
+    def __contains__(self, entity_id):
+        return entity_id in self._states
+
+    def __getitem__(self, entity_id):
+        return self._states[entity_id]
+
+    def __len__(self):
+        return len(self._states)
+
+    def get(self, entity_id, default=None):
+        return self._states.get(entity_id, default)
+
+    def _compact(self, state):
+        entity_id = state["entity_id"]
+        attributes = state.get("attributes") or {}
+        if self.attribute_keys is not None:
+            keys = self.attribute_keys[entity_id]
+            attributes = {key: attributes[key] for key in keys if key in attributes}
+        return {
+            "entity_id": entity_id,
+            "state": state["state"],
+            "attributes": attributes,
+        }
+
+    def _set(self, entity_id, state):
+        """
+        :return: True if the state of the entity changed
+        """
+        if self.attribute_keys is not None and entity_id not in self.attribute_keys:
+            return False
+        if state is None:
+            return self._states.pop(entity_id, None) is not None
+        compact = self._compact(state)
+        if self._states.get(entity_id) == compact:
+            return False
+        self._states[entity_id] = compact
+        return True
+
+    def seed(self, states):
+        """
+        :param states: the result of a *get_states* command
+        :return: the tracked entity ids whose state differs from the mirrored one
+        """
+        changed = [
+            state["entity_id"]
+            for state in states
+            if self._set(state["entity_id"], state)
+        ]
+        self.metrics.gauge("mirrored entities", len(self._states))
+        return changed
+
+    def update(self, message):
+        """
+        :param message: a state_changed event message
+        """
+        try:
+            data = message["event"]["data"]
+            entity_id = data["entity_id"]
+        except (KeyError, TypeError):
+            return
+        self._set(entity_id, data.get("new_state"))
+
+    def make_event(self, entity_id):
+        """
+        :return: a state_changed event message carrying the mirrored state of the entity
+        """
+        return {
+            "type": "event",
+            "event": {
+                "event_type": "state_changed",
+                "data": {
+                    "entity_id": entity_id,
+                    "old_state": None,
+                    "new_state": self._states[entity_id],
+                },
+            },
+        }
@@ -0,0 +1,229 @@
+class Subscription:
+    """
+    The websocket subscriptions needed to receive events for the given entities.
+
+    The messages are built without an ``id``, the Gateway assigns it when sending them.
+    """
+
+    def __init__(self, entity_ids):
+        """
+        :param entity_ids: the entity ids of the triggers associated with the Gateway
+        """
+        self._entity_ids = sorted(entity_ids)
+
+    @property
+    def entity_ids(self):
+        return self._entity_ids
+
+    def make_msgs(self):
+        return []
+
+    def normalize(self, message):
+        """
+        Translate an event received through this subscription into
+        a *state_changed* event message.
+        """
+        return message
+
+    def expand(self, message):
+        """
+        Translate an event received through this subscription into
+        the *state_changed* event messages it carries.
+        """
+        return [self.normalize(message)]
+
+    def __str__(self, *args, **kwargs):
+        return "{} for {} entities".format(
+            self.__class__.__name__, len(self._entity_ids)
+        )
+
+
+class Events(Subscription):
+    """
+    Every event on the Home Assistant bus.
+
+    >>> Events(["sensor.wind"]).make_msgs()
+    [{'type': 'subscribe_events'}]
+    """
+
+    def make_msgs(self):
+        return [{"type": "subscribe_events"}]
+
+
+class StateChanged(Subscription):
+    """
+    Only the *state_changed* events on the Home Assistant bus.
+
+    >>> StateChanged(["sensor.wind"]).make_msgs()
+    [{'type': 'subscribe_events', 'event_type': 'state_changed'}]
+    """
+
+    def make_msgs(self):
+        return [{"type": "subscribe_events", "event_type": "state_changed"}]
+
+
+class Entities(Subscription):
+    """
+    Only the state changes of the given entities,
+    through a Home Assistant state trigger.
+
+    >>> subscription = Entities(["sensor.wind", "media_player.bath"])
+    >>> subscription.make_msgs()
+    [{'type': 'subscribe_trigger', 'trigger': {'platform': 'state', 'entity_id': ['media_player.bath', 'sensor.wind']}}]
+    >>> message = {
+    ...     "id": 3,
+    ...     "type": "event",
+    ...     "event": {
+    ...         "variables": {
+    ...             "trigger": {
+    ...                 "platform": "state",
+    ...                 "entity_id": "sensor.wind",
+    ...                 "from_state": {"entity_id": "sensor.wind", "state": "2.0", "attributes": {}},
+    ...                 "to_state": {"entity_id": "sensor.wind", "state": "3.5", "attributes": {}},
+    ...             }
+    ...         },
+    ...         "context": None,
+    ...     },
+    ... }
+    >>> event = subscription.normalize(message)["event"]
+    >>> event["event_type"], event["data"]["entity_id"], event["data"]["new_state"]["state"]
+    ('state_changed', 'sensor.wind', '3.5')
+    """
+
+    def make_msgs(self):
+        if not self._entity_ids:
+            return []
+        return [
+            {
+                "type": "subscribe_trigger",
+                "trigger": {"platform": "state", "entity_id": self._entity_ids},
+            }
+        ]
+
+    def normalize(self, message):
+        try:
+            trigger = message["event"]["variables"]["trigger"]
+        except (KeyError, TypeError):
+            return message
+        return {
+            "id": message.get("id"),
+            "type": "event",
+            "event": {
+                "data": {
+                    "entity_id": trigger["entity_id"],
+                    "old_state": trigger.get("from_state"),
+                    "new_state": trigger.get("to_state"),
+                },
+                "event_type": "state_changed",
+            },
+        }
+
+
+class EntityDiffs(Subscription):
+    """
+    Only the state changes of the given entities, through the *subscribe_entities*
+    compressed protocol: the whole states come once, then only their differences.
+
+    The states are rebuilt locally, so that every difference is expanded
+    in a *state_changed* event message.
+
+    >>> subscription = EntityDiffs(["media_player.bath"])
+    >>> subscription.make_msgs()
+    [{'type': 'subscribe_entities', 'entity_ids': ['media_player.bath']}]
+    >>> added = {"id": 3, "type": "event", "event": {"a": {"media_player.bath": {
+    ...     "s": "playing", "a": {"volume_level": 0.3, "media_title": "Intro"}, "c": "01", "lc": 1.5}}}}
+    >>> [message["event"]["data"]["new_state"]["state"] for message in subscription.expand(added)]
+    ['playing']
+    >>> changed = {"id": 3, "type": "event", "event": {"c": {"media_player.bath": {
+    ...     "+": {"s": "paused", "a": {"volume_level": 0.4}, "lu": 2.5}, "-": {"a": ["media_title"]}}}}}
+    >>> data = subscription.expand(changed)[0]["event"]["data"]
+    >>> data["old_state"]["state"], data["new_state"]["state"], data["new_state"]["attributes"]
+    ('playing', 'paused', {'volume_level': 0.4})
+    >>> removed = {"id": 3, "type": "event", "event": {"r": ["media_player.bath"]}}
+    >>> data = subscription.expand(removed)[0]["event"]["data"]
+    >>> data["old_state"]["state"], data["new_state"]
+    ('paused', None)
+    """
+
+    def __init__(self, entity_ids):
+        super(EntityDiffs, self).__init__(entity_ids)
+        self._states = dict()
+
+    def make_msgs(self):
+        if not self._entity_ids:
+            return []
+        return [{"type": "subscribe_entities", "entity_ids": self._entity_ids}]
+
+    @staticmethod
+    def _make_message(message, entity_id, old_state, new_state):
+        return {
+            "id": message.get("id"),
+            "type": "event",
+            "event": {
+                "data": {
+                    "entity_id": entity_id,
+                    "old_state": old_state,
+                    "new_state": new_state,
+                },
+                "event_type": "state_changed",
+            },
+        }
+
+    @staticmethod
+    def _add(entity_id, compressed):
+        return {
+            "entity_id": entity_id,
+            "state": compressed.get("s"),
+            "attributes": compressed.get("a") or {},
+            "last_changed": compressed.get("lc"),
+            "last_updated": compressed.get("lu", compressed.get("lc")),
+        }
+
+    @staticmethod
+    def _change(old_state, diff):
+        new_state = dict(old_state)
+        additions = diff.get("+", {})
+        removals = diff.get("-", {})
+        if "s" in additions:
+            new_state["state"] = additions["s"]
+        if "lc" in additions:
+            new_state["last_changed"] = additions["lc"]
+            new_state["last_updated"] = additions["lc"]
+        if "lu" in additions:
+            new_state["last_updated"] = additions["lu"]
+        if "a" in additions or "a" in removals:
+            # the old attributes are shared with the old state, never changed in place
+            attributes = dict(old_state["attributes"])
+            attributes.update(additions.get("a", {}))
+            for key in removals.get("a", ()):
+                attributes.pop(key, None)
+            new_state["attributes"] = attributes
+        return new_state
+
+    def expand(self, message):
+        try:
+            event = message["event"]
+        except (KeyError, TypeError):
+            return [message]
+        messages = list()
+        for entity_id, compressed in event.get("a", {}).items():
+            new_state = self._add(entity_id, compressed)
+            old_state = self._states.get(entity_id)
+            self._states[entity_id] = new_state
+            messages.append(
+                self._make_message(message, entity_id, old_state, new_state)
+            )
+        for entity_id, diff in event.get("c", {}).items():
+            old_state = self._states.get(entity_id)
+            if old_state is None:
+                # a difference of an entity never added, i.e. by a previous subscription
+                old_state = self._add(entity_id, {})
+            new_state = self._change(old_state, diff)
+            self._states[entity_id] = new_state
+            messages.append(
+                self._make_message(message, entity_id, old_state, new_state)
+            )
+        for entity_id in event.get("r", ()):
+            old_state = self._states.pop(entity_id, None)
+            messages.append(self._make_message(message, entity_id, old_state, None))
+        return messages
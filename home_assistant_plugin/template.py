@@ -0,0 +1,122 @@
+import re
+
+from home_assistant_plugin.message import replace
+
+PLACEHOLDER = "__template_variable_{}__"
+
+
+class Template:
+    """
+    A command message encoded once, so that sending it costs only
+    the encoding of its id and of its variable service data fields.
+
+    >>> from home_assistant_plugin import codec
+    >>> message = {
+    ...     "type": "call_service",
+    ...     "domain": "media_player",
+    ...     "service": "volume_set",
+    ...     "service_data": {"entity_id": ["media_player.bath"], "volume_level": 0.1},
+    ... }
+    >>> template = Template(message, ("volume_level",), codec.Json())
+    >>> prepared = template.prepare(replace(message, ("service_data", "volume_level"), 0.5))
+    >>> prepared["id"] = 7
+    >>> prepared["domain"], prepared["service"]
+    ('media_player', 'volume_set')
+    >>> prepared.encode()
+    '{"id":7,"type":"call_service","domain":"media_player","service":"volume_set","service_data":{"entity_id":["media_player.bath"],"volume_level":0.5}}'
+    >>> import json
+    >>> json.loads(prepared.encode()) == dict(replace(message, ("service_data", "volume_level"), 0.5), id=7)
+    True
+    >>> prepared.to_message()["service_data"]
+    {'entity_id': ['media_player.bath'], 'volume_level': 0.5}
+    """
+
+    def __init__(self, message, variables, codec):
+        """
+        :param message: a command message
+        :param variables: the service data fields changing between executions
+        :param codec: the codec.Json like codec encoding the message
+        """
+        self.message = message
+        self.variables = variables
+        self.codec = codec
+        for n, variable in enumerate(variables):
+            message = replace(
+                message, ("service_data", variable), PLACEHOLDER.format(n)
+            )
+        body = codec.dumps(message)
+        # the id is spliced in front of the other fields
+        self._prefix = '{"id":'
+        parts = re.split('"{}"'.format(PLACEHOLDER.format(r"(\d+)")), "," + body[1:])
+        self._parts = parts[0::2]
+        self._order = [int(n) for n in parts[1::2]]
+
+    def prepare(self, message):
+        """
+        :param message: a message built from the same command, with its own variable fields
+        :return: a Prepared message waiting for an id
+        """
+        service_data = message["service_data"]
+        return Prepared(self, [service_data[variable] for variable in self.variables])
+
+    def render(self, msg_id, values):
+        dumps = self.codec.dumps
+        chunks = [self._prefix, str(msg_id), self._parts[0]]
+        for n, part in zip(self._order, self._parts[1:]):
+            chunks.append(dumps(values[n]))
+            chunks.append(part)
+        return "".join(chunks)
+
+
+def prepare(command, codec):
+    """
+    :param command: a Command or a notify Command
+    :param codec: the codec encoding the command
+    :return: a Prepared message of the command, its Template is built once
+    and shared by the commands made from the same configured command
+    """
+    template = command._templates.get(codec.NAME)
+    if template is None:
+        template = Template(command.message, command.Variables, codec)
+        command._templates[codec.NAME] = template
+    return template.prepare(command.message)
+
+
+class Prepared:
+    """
+    A message of a Template with its variable fields, numbered once sent.
+
+    It exposes the message fields like a dict, only its id can be set.
+    """
+
+    __slots__ = ("_template", "_values", "_id")
+
+    def __init__(self, template, values):
+        self._template = template
+        self._values = values
+        self._id = None
+
+    def __getitem__(self, key):
+        if key == "id":
+            return self._id
+        return self._template.message[key]
+
+    def __setitem__(self, key, value):
+        if key != "id":
+            raise KeyError(key)
+        self._id = value
+
+    def encode(self):
+        return self._template.render(self._id, self._values)
+
+    def to_message(self):
+        """
+        :return: the message as a dict, without id
+        """
+        message = self._template.message
+        for variable, value in zip(self._template.variables, self._values):
+            message = replace(message, ("service_data", variable), value)
+        return message
+
+    def __repr__(self):
+        return self.encode()
@@ -0,0 +1,395 @@
+import asyncio
+import itertools
+import json
+import time
+
+from aiohttp import web
+
+
+class Server:
+    """
+    A local stand-in for the Home Assistant websocket API.
+
+    It implements the authentication handshake, the subscriptions (*subscribe_entities*
+    included), *get_services*, *get_states*, *call_service* results and streams synthetic
+    *state_changed* events, coalescing them once asked through *supported_features*.
+
+    >>> import asyncio
+    >>> import home_assistant_plugin
+    >>> from home_assistant_plugin.tests.server import Server
+    >>> always = home_assistant_plugin.service.sensor.float.trigger.Always
+    >>> play = home_assistant_plugin.service.media_player.command.Play
+    >>> async def main(scenario, count=10, tracked=None, states=(), **options):
+    ...     server = Server(entities=2, count=count, rate=0)
+    ...     for entity_id, state in states:
+    ...         server.states[entity_id] = server.make_state(entity_id, state)
+    ...     await server.start()
+    ...     gateway = home_assistant_plugin.Gateway(server.token, server.host, server.port, **options)
+    ...     gateway.associate_triggers(
+    ...         [always.make(entity_id) for entity_id in tracked or server.entity_ids]
+    ...     )
+    ...     received = []
+    ...     async def task(trigger):
+    ...         received.append(trigger)
+    ...     running = asyncio.ensure_future(gateway.run([task]))
+    ...     try:
+    ...         return await scenario(server, gateway, received)
+    ...     finally:
+    ...         running.cancel()
+    ...         await gateway.disconnect()
+    ...         await server.stop()
+    >>> async def streamed(server, gateway, received):
+    ...     await server.wait_streamed()
+    ...     while len(received) + gateway.metrics["frames skipped"] < server.streamed:
+    ...         await asyncio.sleep(0.01)
+    ...     return received, gateway.metrics
+    >>> received, metrics = asyncio.run(main(streamed))
+    >>> len(received), sorted({trigger.entity_id for trigger in received})
+    (10, ['sensor.fake_0', 'sensor.fake_1'])
+
+    Coalesced messages
+
+    >>> received, metrics = asyncio.run(main(streamed, coalesce_messages=True))
+    >>> len(received), metrics["events received"]
+    (10, 10)
+    >>> metrics["frames received"] < metrics["messages received"]
+    True
+
+    Frames decoded and dispatched in batches
+
+    >>> received, metrics = asyncio.run(main(streamed, max_batch=32, max_batch_wait=0.001))
+    >>> len(received), metrics["events received"]
+    (10, 10)
+
+    Compressed entity differences
+
+    >>> received, metrics = asyncio.run(
+    ...     main(streamed, subscription_mode=home_assistant_plugin.subscription.EntityDiffs)
+    ... )
+    >>> len(received), [trigger.entity_id for trigger in received][:4]
+    (10, ['sensor.fake_0', 'sensor.fake_1', 'sensor.fake_0', 'sensor.fake_1'])
+
+    Events of entities without triggers skipped before being decoded
+
+    >>> received, metrics = asyncio.run(
+    ...     main(streamed, tracked=["sensor.fake_1"], prefilter_events=True)
+    ... )
+    >>> len(received), metrics["frames skipped"], metrics["events received"]
+    (5, 5, 5)
+
+    Events received against events dispatched, per subscription
+
+    >>> async def filtered(server, gateway, received):
+    ...     await server.wait_streamed()
+    ...     while gateway.metrics["events received StateChanged"] < server.streamed:
+    ...         await asyncio.sleep(0.01)
+    ...     return gateway.metrics
+    >>> metrics = asyncio.run(main(filtered, tracked=["sensor.fake_1"]))
+    >>> metrics["events received StateChanged"], metrics["events dispatched StateChanged"]
+    (10, 5)
+
+    Command results
+
+    >>> async def called(server, gateway, received):
+    ...     result = await gateway.call(play.make(["bath_player"]), timeout=5)
+    ...     return result, server.calls, gateway.metrics
+    >>> result, calls, metrics = asyncio.run(main(called, count=0))
+    >>> calls[0]["id"] == int(result["context"]["id"])
+    True
+    >>> metrics["commands in flight"], metrics["round trip ms media_player.media_play"].count
+    (0, 1)
+
+    Commands merged in a single call
+
+    >>> async def merged(server, gateway, received):
+    ...     results = await asyncio.gather(
+    ...         *[gateway.call(play.make("media_player.{}".format(n)), timeout=5) for n in range(5)]
+    ...     )
+    ...     return results, server.calls
+    >>> results, calls = asyncio.run(main(merged, count=0, merge_window=0.05))
+    >>> len(results), len(calls), calls[0]["service_data"]["entity_id"]
+    (5, 1, ['media_player.0', 'media_player.1', 'media_player.2', 'media_player.3', 'media_player.4'])
+    >>> results, calls = asyncio.run(main(merged, count=0, merge_window=0.05, max_send_rate=100))
+    >>> len(results), len(calls)
+    (5, 1)
+
+    Reconnection, with commands issued while disconnected sent once ready again
+
+    >>> async def reconnected(server, gateway, received):
+    ...     await gateway.call(play.make(["bath_player"]), timeout=5)
+    ...     await server.drop()
+    ...     while gateway.state == gateway.READY:
+    ...         await asyncio.sleep(0.001)
+    ...     await gateway.call(play.make(["bath_player"]), timeout=5)
+    ...     return server.calls, gateway.metrics
+    >>> calls, metrics = asyncio.run(main(
+    ...     reconnected, count=0,
+    ...     backoff=home_assistant_plugin.backoff.Backoff(initial=0.01, jitter=0),
+    ... ))
+    >>> len(calls), metrics["reconnections"], metrics["time to recover ms"].count
+    (2, 1, 1)
+
+    States mirrored at boot
+
+    >>> async def seeded(server, gateway, received):
+    ...     while not received:
+    ...         await asyncio.sleep(0.01)
+    ...     return received, gateway.states
+    >>> received, states = asyncio.run(main(
+    ...     seeded, count=0, tracked=["sensor.fake_1"], mirror_states=True,
+    ...     states=[("sensor.fake_0", "0.5"), ("sensor.fake_1", "1.5")],
+    ... ))
+    >>> [trigger.entity_id for trigger in received], len(states), states["sensor.fake_1"]["state"]
+    (['sensor.fake_1'], 1, '1.5')
+    """
+
+    def __init__(
+        self,
+        token="token",
+        entities=10,
+        rate=100,
+        count=None,
+        attributes=4,
+        attribute_size=16,
+        batch=16,
+        host="127.0.0.1",
+        port=0,
+    ):
+        """
+        :param token: the accepted access token
+        :param entities: how many sensor entities change state
+        :param rate: state_changed events per second, 0 for as fast as possible
+        :param count: how many state_changed events to stream, None for an endless stream
+        :param attributes: how many attributes every state carries
+        :param attribute_size: the length of every attribute value
+        :param batch: how many events a coalesced frame carries at most,
+        when the client asks for coalesced messages
+        :param host: the listening address
+        :param port: the listening port, 0 for a free one
+        """
+        self.token = token
+        self.host = host
+        self.port = port
+        self.entity_ids = ["sensor.fake_{}".format(n) for n in range(entities)]
+        self._rate = rate
+        self._count = count
+        self._attributes = {
+            "attribute_{}".format(n): "x" * attribute_size for n in range(attributes)
+        }
+        self._batch = batch
+        self._runner = None
+        self._websockets = set()
+        self._streamed = asyncio.Event()
+        self.streamed = 0
+        self.sent_at = dict()
+        self.calls = list()
+        self.frames_received = 0
+        self.messages_received = 0
+        self.states = dict()
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/api/websocket", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    async def drop(self):
+        """
+        Close every open connection, as when Home Assistant restarts.
+        """
+        for websocket in list(self._websockets):
+            await websocket.close()
+
+    async def wait_streamed(self):
+        """
+        Wait until *count* events have been streamed.
+        """
+        await self._streamed.wait()
+
+    def make_state(self, entity_id, state):
+        return {
+            "entity_id": entity_id,
+            "state": state,
+            "attributes": self._attributes,
+            "last_changed": "2021-11-26T01:37:24.265390+00:00",
+            "last_updated": "2021-11-26T01:37:24.265390+00:00",
+            "context": {"id": "01FNC3YHRKBQ6PMZ0K3Q8J3B3W", "user_id": None},
+        }
+
+    def make_compressed(self, subscription, entity_id, new_state):
+        if entity_id in subscription["known"]:
+            return {
+                "c": {entity_id: {"+": {"s": new_state["state"], "lu": time.time()}}}
+            }
+        subscription["known"].add(entity_id)
+        return {
+            "a": {
+                entity_id: {
+                    "s": new_state["state"],
+                    "a": new_state["attributes"],
+                    "c": new_state["context"]["id"],
+                    "lc": time.time(),
+                }
+            }
+        }
+
+    def make_event(self, subscription, entity_id, old_state, new_state):
+        if subscription["type"] == "subscribe_entities":
+            event = self.make_compressed(subscription, entity_id, new_state)
+        elif subscription["type"] == "subscribe_trigger":
+            event = {
+                "variables": {
+                    "trigger": {
+                        "platform": "state",
+                        "entity_id": entity_id,
+                        "from_state": old_state,
+                        "to_state": new_state,
+                    }
+                },
+                "context": None,
+            }
+        else:
+            event = {
+                "event_type": "state_changed",
+                "data": {
+                    "entity_id": entity_id,
+                    "old_state": old_state,
+                    "new_state": new_state,
+                },
+                "origin": "LOCAL",
+                "time_fired": "2021-11-26T01:37:24.265429+00:00",
+            }
+        return {"id": subscription["id"], "type": "event", "event": event}
+
+    async def _send(self, websocket, events, coalesce):
+        sent_at = time.monotonic()
+        for event in events:
+            if event["event"].get("event_type") == "state_changed":
+                data = event["event"]["data"]
+            elif "a" in event["event"] or "c" in event["event"]:
+                entity_id, diff = next(
+                    iter((event["event"].get("a") or event["event"]["c"]).items())
+                )
+                data = {
+                    "entity_id": entity_id,
+                    "new_state": {"state": diff.get("s") or diff["+"]["s"]},
+                }
+            else:
+                trigger = event["event"]["variables"]["trigger"]
+                data = {
+                    "entity_id": trigger["entity_id"],
+                    "new_state": trigger["to_state"],
+                }
+            self.sent_at[(data["entity_id"], data["new_state"]["state"])] = sent_at
+        if coalesce and len(events) > 1:
+            await websocket.send_str(json.dumps(events))
+        else:
+            for event in events:
+                await websocket.send_str(json.dumps(event))
+
+    def is_subscribed(self, subscription, entity_id):
+        if subscription["type"] == "subscribe_trigger":
+            return entity_id in subscription["trigger"]["entity_id"]
+        if subscription["type"] == "subscribe_entities":
+            return entity_id in subscription["entity_ids"]
+        return subscription.get("event_type") in (None, "state_changed")
+
+    async def _handle(self, request):
+        websocket = web.WebSocketResponse()
+        await websocket.prepare(request)
+        await websocket.send_str(json.dumps({"type": "auth_required"}))
+        msg = await websocket.receive_json()
+        if msg.get("access_token") != self.token:
+            await websocket.send_str(json.dumps({"type": "auth_invalid"}))
+            await websocket.close()
+            return websocket
+        await websocket.send_str(json.dumps({"type": "auth_ok"}))
+
+        connection = {"subscriptions": dict(), "coalesce": False}
+        streamer = asyncio.ensure_future(self._stream(websocket, connection))
+        self._websockets.add(websocket)
+        try:
+            async for frame in websocket:
+                self.frames_received += 1
+                for msg in self.parse(frame.data):
+                    self.messages_received += 1
+                    await websocket.send_str(
+                        json.dumps(self.make_result(msg, connection))
+                    )
+                    if msg["type"] == "subscribe_entities":
+                        await self._send_known(websocket, msg)
+        finally:
+            self._websockets.discard(websocket)
+            streamer.cancel()
+        return websocket
+
+    async def _send_known(self, websocket, subscription):
+        # the whole states of the subscribed entities follow a subscribe_entities result
+        for entity_id in subscription["entity_ids"]:
+            if entity_id in self.states and entity_id not in subscription["known"]:
+                event = self.make_event(
+                    subscription, entity_id, None, self.states[entity_id]
+                )
+                await self._send(websocket, [event], False)
+
+    @staticmethod
+    def parse(data):
+        msgs = json.loads(data)
+        return msgs if isinstance(msgs, list) else [msgs]
+
+    def make_result(self, msg, connection):
+        subscriptions = connection["subscriptions"]
+        result = {"id": msg["id"], "type": "result", "success": True, "result": None}
+        if msg["type"] in ("subscribe_events", "subscribe_trigger"):
+            subscriptions[msg["id"]] = msg
+        elif msg["type"] == "subscribe_entities":
+            msg["known"] = set()
+            subscriptions[msg["id"]] = msg
+        elif msg["type"] == "unsubscribe_events":
+            subscriptions.pop(msg["subscription"], None)
+        elif msg["type"] == "supported_features":
+            connection["coalesce"] = bool(msg["features"].get("coalesce_messages"))
+        elif msg["type"] == "get_services":
+            result["result"] = {}
+        elif msg["type"] == "get_states":
+            result["result"] = list(self.states.values())
+        elif msg["type"] == "call_service":
+            self.calls.append(msg)
+            result["result"] = {"context": {"id": str(msg["id"])}}
+        else:
+            result["success"] = False
+            result["error"] = {"code": "unknown_command", "message": "Unknown command."}
+        return result
+
+    async def _stream(self, websocket, connection):
+        subscriptions = connection["subscriptions"]
+        counter = itertools.count() if self._count is None else range(self._count)
+        period = 1 / self._rate if self._rate else 0
+        started = time.monotonic()
+        pending = list()
+        while not subscriptions:
+            await asyncio.sleep(0.01)
+        for n in counter:
+            entity_id = self.entity_ids[n % len(self.entity_ids)]
+            old_state = self.states.get(entity_id)
+            new_state = self.make_state(entity_id, "{}.0".format(n))
+            self.states[entity_id] = new_state
+            for subscription in list(subscriptions.values()):
+                if self.is_subscribed(subscription, entity_id):
+                    pending.append(
+                        self.make_event(subscription, entity_id, old_state, new_state)
+                    )
+            delay = started + (n + 1) * period - time.monotonic()
+            if delay > 0 or len(pending) >= self._batch or not connection["coalesce"]:
+                await self._send(websocket, pending, connection["coalesce"])
+                pending = list()
+            self.streamed += 1
+            await asyncio.sleep(delay if delay > 0 else 0)
+        await self._send(websocket, pending, connection["coalesce"])
+        self._streamed.set()
@@ -1,14 +1,36 @@
 import unittest  # noqa
 import doctest
 import home_assistant_plugin
+from home_assistant_plugin.tests import server
 
 
 def load_tests(loader, tests, ignore):
+    tests.addTests(doctest.DocTestSuite(home_assistant_plugin.gateway))
     tests.addTests(doctest.DocTestSuite(home_assistant_plugin.message))
     tests.addTests(
         doctest.DocTestSuite(home_assistant_plugin.service.media_player.command)
     )
+    tests.addTests(doctest.DocTestSuite(home_assistant_plugin.service.trigger))
     tests.addTests(doctest.DocTestSuite(home_assistant_plugin.service.sensor.trigger))
     tests.addTests(doctest.DocTestSuite(home_assistant_plugin.service.notify.command))
+    tests.addTests(doctest.DocTestSuite(home_assistant_plugin.metrics))
+    tests.addTests(doctest.DocTestSuite(home_assistant_plugin.subscription))
+    tests.addTests(doctest.DocTestSuite(home_assistant_plugin.codec))
+    tests.addTests(doctest.DocTestSuite(home_assistant_plugin.recorder))
+    tests.addTests(doctest.DocTestSuite(home_assistant_plugin.outbox))
+    tests.addTests(doctest.DocTestSuite(home_assistant_plugin.template))
+    tests.addTests(doctest.DocTestSuite(home_assistant_plugin.correlator))
+    tests.addTests(doctest.DocTestSuite(home_assistant_plugin.backoff))
+    tests.addTests(doctest.DocTestSuite(home_assistant_plugin.states))
+    tests.addTests(doctest.DocTestSuite(home_assistant_plugin.executor))
+    tests.addTests(doctest.DocTestSuite(home_assistant_plugin.dispatcher))
+    tests.addTests(doctest.DocTestSuite(home_assistant_plugin.factory.trigger))
+    tests.addTests(doctest.DocTestSuite(home_assistant_plugin.factory.threshold))
+    tests.addTests(doctest.DocTestSuite(home_assistant_plugin.prefilter))
+    tests.addTests(doctest.DocTestSuite(home_assistant_plugin.window))
+    tests.addTests(
+        doctest.DocTestSuite(home_assistant_plugin.service.sensor.float.trigger)
+    )
+    tests.addTests(doctest.DocTestSuite(server))
 
     return tests
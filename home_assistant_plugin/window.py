@@ -0,0 +1,108 @@
+import collections
+import math
+
+
+class Window:
+    """
+    The latest numeric samples of a sensor, within a count or a time window,
+    aggregated as they stream in.
+
+    The sum and the extremes are kept up to date on every sample,
+    so that the mean, min and max cost the same whatever the window size;
+    percentiles sort the window when asked.
+
+    >>> window = Window(samples=3)
+    >>> for n, value in enumerate((4.0, 1.0, 7.0, 3.0)):
+    ...     window.add(value, n)
+    >>> len(window), window.aggregate("mean"), window.aggregate("min"), window.aggregate("max")
+    (3, 3.6666666666666665, 1.0, 7.0)
+    >>> window.aggregate("p50")
+    3.0
+    >>> window = Window(seconds=10)
+    >>> for now, value in ((0, 5.0), (4, 1.0), (12, 3.0), (13, float("nan"))):
+    ...     window.add(value, now)
+    >>> len(window), window.aggregate("min"), window.aggregate("mean")
+    (2, 1.0, 2.0)
+    >>> Window(samples=3).aggregate("mean")
+    nan
+    """
+
+    AGGREGATES = ("mean", "min", "max")
+
+    def __init__(self, samples=None, seconds=None):
+        """
+        :param samples: how many samples the window keeps at most, unlimited when None
+        :param seconds: how old the kept samples can be at most, unlimited when None
+        """
+        self._samples = samples
+        self._seconds = seconds
+        self._sequence = 0
+        # (sequence, time, value) tuples, the oldest first
+        self._entries = collections.deque()
+        self._sum = 0.0
+        # (sequence, value) tuples, the candidate extremes of the window
+        self._minima = collections.deque()
+        self._maxima = collections.deque()
+
+    @classmethod
+    def is_aggregate(cls, name):
+        """
+        :param name: mean, min, max or a percentile like p95
+        """
+        if name in cls.AGGREGATES:
+            return True
+        return name.startswith("p") and name[1:].isdigit() and int(name[1:]) <= 100
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, value, now):
+        """
+        :param value: a sample, NaN ones are ignored
+        :param now: the monotonic time of the sample
+        """
+        if value != value:
+            return
+        self._sequence += 1
+        self._entries.append((self._sequence, now, value))
+        self._sum += value
+        while self._minima and self._minima[-1][1] >= value:
+            self._minima.pop()
+        self._minima.append((self._sequence, value))
+        while self._maxima and self._maxima[-1][1] <= value:
+            self._maxima.pop()
+        self._maxima.append((self._sequence, value))
+        self._evict(now)
+
+    def _evict(self, now):
+        entries = self._entries
+        while entries and (
+            (self._samples is not None and len(entries) > self._samples)
+            or (self._seconds is not None and now - entries[0][1] > self._seconds)
+        ):
+            sequence, _, value = entries.popleft()
+            self._sum -= value
+            if self._minima[0][0] == sequence:
+                self._minima.popleft()
+            if self._maxima[0][0] == sequence:
+                self._maxima.popleft()
+        if not entries:
+            # forget the rounding errors of the running sum
+            self._sum = 0.0
+
+    def aggregate(self, name):
+        """
+        :param name: mean, min, max or a percentile like p95
+        :return: the aggregated samples, NaN when the window is empty
+        """
+        if not self._entries:
+            return math.nan
+        if name == "mean":
+            return self._sum / len(self._entries)
+        if name == "min":
+            return self._minima[0][1]
+        if name == "max":
+            return self._maxima[0][1]
+        values = sorted(value for _, _, value in self._entries)
+        rank = math.ceil(int(name[1:]) / 100 * len(values))
+        return values[max(rank, 1) - 1]
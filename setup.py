@@ -23,5 +23,6 @@ setup(name="automate-home-assistant-plugin",
       ],
       packages=find_packages(exclude=[]),
       include_package_data=True,
-      install_requires=['automate-home', 'aiohttp']
+      install_requires=['automate-home', 'aiohttp'],
+      extras_require={'fast': ['orjson']}
 )